@@ -2,17 +2,20 @@ from flask import Flask, redirect
 from flask_restx import Api
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
+from . import cli
+from . import database
+from . import replication
+from . import serialization
+from .pagination import NEXT_CURSOR_HEADER
+from .replication import RoutingSession
 
-# defining database
-db = SQLAlchemy()
+# defining database, reads may be routed to replicas (app/replication.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-#defining migrations
-migrate = Migrate()
-
-def create_app():
+def create_app(config=None):
 
     # app creating line
     app = Flask(__name__, instance_relative_config=True)
@@ -22,18 +25,109 @@ def create_app():
         # this should be changed later, moved to the env file
         JWT_SECRET_KEY = "dev",
         SECRET_KEY = 'dev', 
-        SQLALCHEMY_DATABASE_URI='sqlite:///C:/Users/zuzia/Documents/GitHub/collectoback/instance/collecto.sqlite',
+        SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or database.default_uri(app.instance_path),
         SQLALCHEMY_TRACK_MODIFICATIONS = False,
-        RESTX_MASK_SWAGGER = False
+        RESTX_MASK_SWAGGER = False,
+        # connection pool of server databases (postgres, mysql)
+        DB_POOL_SIZE = 10,
+        DB_MAX_OVERFLOW = 20,
+        DB_POOL_RECYCLE = 1800,
+        DB_POOL_TIMEOUT = 30,
+        DB_POOL_PRE_PING = True,
+        # read replicas for GET requests, e.g. ["sqlite:///.../replica.sqlite"];
+        # users who wrote read from the primary for this many seconds
+        DB_REPLICA_URIS = [],
+        DB_REPLICA_STICKY_SECONDS = 5,
+        # ASGI serving mode (app/asgi.py): async engine, None uses the async
+        # driver of SQLALCHEMY_DATABASE_URI (e.g. sqlite+aiosqlite), and the
+        # threads serving the routes that stay synchronous
+        ASYNC_DATABASE_URI = None,
+        ASYNC_WSGI_THREADS = 16,
+        # pragmas set on every SQLite connection, see app/database.py
+        SQLITE_JOURNAL_MODE = 'WAL',
+        SQLITE_SYNCHRONOUS = 'NORMAL',
+        SQLITE_BUSY_TIMEOUT = 5000,
+        SQLITE_MMAP_SIZE = 256 * 1024 * 1024,
+        SQLITE_CACHE_SIZE = -64000,
+        # export jobs: rendering processes and on-disk artifact cache
+        EXPORT_WORKERS = 2,
+        EXPORT_CACHE_DIR = None,
+        # follow edge and user lookup caches, see app/authz.py
+        AUTHZ_CACHE_SIZE = 10000,
+        AUTHZ_CACHE_TTL = 60,
+        AUTHZ_NEGATIVE_TTL = 5,
+        # bcrypt work factor and the process pool hashing runs in (0 workers
+        # hashes inline); beyond PASSWORD_HASH_QUEUE pending hashes auth answers 503
+        BCRYPT_LOG_ROUNDS = 12,
+        PASSWORD_HASH_WORKERS = 2,
+        PASSWORD_HASH_QUEUE = 16,
+        PASSWORD_HASH_TIMEOUT = 5,
+        PASSWORD_HASH_RETRY_AFTER = 1,
+        # failed logins allowed per email and per client address within the window (seconds)
+        LOGIN_MAX_FAILURES = 5,
+        LOGIN_MAX_FAILURES_PER_ADDRESS = 50,
+        LOGIN_FAILURE_WINDOW = 300,
+        # reverse proxies in front of the app that append to X-Forwarded-For;
+        # with 0 the socket address is the client, behind a proxy that would
+        # put every client under the same per-address login limit
+        TRUSTED_PROXIES = 0,
+        # activity feed: users following at least this many others get a
+        # precomputed timeline holding the newest FEED_TIMELINE_SIZE entries,
+        # writes of users with more followers are merged on read instead
+        FEED_TIMELINE_MIN_FOLLOWING = 100,
+        FEED_TIMELINE_SIZE = 1000,
+        FEED_FANOUT_MAX_FOLLOWERS = 1000,
+        # hot list endpoints skip restx marshalling, see app/serialization.py
+        FAST_SERIALIZATION = True,
+        # serialized collection pages, see app/response_cache.py;
+        # 'memory' per worker, 'sqlite' shared by all workers, None disables it
+        RESPONSE_CACHE = 'memory',
+        RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024,
+        RESPONSE_CACHE_PATH = None,
+        # per-endpoint latency and SQL counters on /metrics, see app/metrics.py;
+        # requests over either threshold (None disables it) are logged as slow
+        # together with their most expensive statements
+        METRICS = True,
+        METRICS_SLOW_REQUEST_SECONDS = 1.0,
+        METRICS_SLOW_REQUEST_QUERIES = 50,
+        METRICS_SLOW_TOP_STATEMENTS = 5
     )
 
-    # allowing frontend for query
-    CORS(app)
+    # deployment settings: instance/config.py, then COLLECTO_* environment
+    # variables (values parsed as JSON), e.g. COLLECTO_DB_POOL_SIZE=20
+    app.config.from_pyfile('config.py', silent=True)
+    app.config.from_prefixed_env('COLLECTO')
+
+    # explicit overrides, e.g. for export worker processes
+    if config:
+        app.config.update(config)
+
+    # client address and scheme as seen by the outermost trusted proxy
+    if app.config['TRUSTED_PROXIES']:
+        proxies = app.config['TRUSTED_PROXIES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+
+    os.makedirs(app.instance_path, exist_ok=True)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database.engine_options(app.config)
+    replication.configure(app)
 
-    # db and migration init
+    # allowing frontend for query; browsers hide response headers from
+    # cross-origin scripts unless they are exposed, and lists are paged
+    # through the cursor header
+    CORS(app, expose_headers=[NEXT_CURSOR_HEADER, 'ETag'])
+
+    # db and migration init, Flask-Migrate is loaded by `flask db` only (app/cli.py)
     db.init_app(app)
-    migrate.init_app(app, db)
+    database.init_app(app, db)
+    replication.init_app(app)
+    app.cli.add_command(cli.MigrateGroup(db))
     jwt = JWTManager(app)
+
+    from . import authz, metrics, response_cache, throttling
+    metrics.init_app(app)
+    authz.init_app(app)
+    throttling.init_app(app)
+    response_cache.init_app(app)
     
     @app.route('/')
     def home():
@@ -69,6 +163,8 @@ def create_app():
     from .routes.follow import follow_ns as follow_ns
     from .routes.explore import explore_ns as explore_ns
     from .routes.export import export_ns as export_ns
+    from .routes.search import search_ns as search_ns
+    from .routes.feed import feed_ns as feed_ns
     api.add_namespace(auth_ns, path='/auth')
     api.add_namespace(dashboard_ns, path='/dashboard')
     api.add_namespace(categories_ns, path='/categories')
@@ -76,5 +172,10 @@ def create_app():
     api.add_namespace(follow_ns, path='/follow')
     api.add_namespace(explore_ns, path='/explore')
     api.add_namespace(export_ns, path='/export')
+    api.add_namespace(search_ns, path='/search')
+    api.add_namespace(feed_ns, path='/feed')
+
+    # /swagger.json is built on its first request, then served encoded
+    serialization.cache_specs(app, api)
     
     return app
\ No newline at end of file
@@ -0,0 +1,195 @@
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.util import greenlet_spawn
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+from app import create_app
+from app import database
+
+# ASGI serving mode, e.g.  uvicorn app.asgi:app --workers 2
+# (needs aiosqlite, asyncpg or aiomysql for the database).
+#
+# The read-heavy GET endpoints below run their usual flask-restx handlers on
+# the event loop inside a SQLAlchemy greenlet: every query goes through an
+# async engine and yields to other requests while it waits on the database,
+# so one process keeps many of them in flight. All other routes (writes,
+# auth, exports, Swagger) run on a pool of ASYNC_WSGI_THREADS threads with
+# streamed bodies. Handlers, hooks and the Swagger contract are the same in
+# both modes.
+
+ASYNC_RULES = {
+    '/categories',
+    '/categories/<int:category_id>',
+    '/items/all/<int:category_id>',
+    '/items/details/<int:item_id>',
+    '/explore/<int:user_id>/categories',
+    '/explore/<int:user_id>/items/<int:category_id>',
+    '/follow/',
+}
+
+ASYNC_METHODS = {'GET', 'HEAD'}
+
+# request bodies above this size are buffered on disk
+SPOOL_SIZE = 1024 * 1024
+
+
+class AsyncApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.engines = database.create_async_engines(flask_app)
+        self.executor = ThreadPoolExecutor(
+            max_workers=flask_app.config['ASYNC_WSGI_THREADS'], thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        body = await _read_body(receive)
+        try:
+            environ = _environ(scope, body)
+            if scope['method'] in ASYNC_METHODS and self._is_async(environ):
+                await self._serve_async(environ, send)
+            else:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self.executor, self._run_threaded, environ, send, loop)
+        finally:
+            body.close()
+
+    async def _serve_async(self, environ, send):
+        token = database.use_async_engines(self.engines)
+        try:
+            status, headers, chunks = await greenlet_spawn(self._run, environ)
+        finally:
+            database.reset_async_engines(token)
+        await send(_start_message(status, headers))
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+
+    def _is_async(self, environ):
+        adapter = self.flask_app.url_map.bind_to_environ(environ)
+        try:
+            rule, _ = adapter.match(return_rule=True)
+        except (HTTPException, RequestRedirect):
+            return False
+        return rule.rule in ASYNC_RULES
+
+    def _run(self, environ):
+        # the whole WSGI request (hooks, handler, teardown) inside the greenlet
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        result = self.flask_app(environ, start_response)
+        try:
+            chunks = list(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return started['status'], started['headers'], chunks
+
+    def _run_threaded(self, environ, send, loop):
+        # WSGI request on a pool thread, the body is sent as it is produced
+        def send_sync(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        result = self.flask_app(environ, start_response)
+        sent_start = False
+        try:
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not sent_start:
+                    send_sync(_start_message(started['status'], started['headers']))
+                    sent_start = True
+                send_sync({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        if not sent_start:
+            send_sync(_start_message(started['status'], started['headers']))
+        send_sync({'type': 'http.response.body', 'body': b''})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in self.engines.values():
+                    await engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+async def _read_body(receive):
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    while True:
+        message = await receive()
+        body.write(message.get('body', b''))
+        if not message.get('more_body'):
+            body.seek(0)
+            return body
+
+
+def _start_message(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    }
+
+
+def _environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+
+    # the body is fully buffered, also chunked uploads that came without a
+    # Content-Length, which WSGI apps would otherwise read as empty
+    environ['wsgi.input_terminated'] = True
+    if 'CONTENT_LENGTH' not in environ:
+        environ['CONTENT_LENGTH'] = str(body.seek(0, 2))
+        body.seek(0)
+    return environ
+
+
+def create_asgi_app(config=None):
+    return AsyncApp(create_app(config))
+
+
+app = create_asgi_app()
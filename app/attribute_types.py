@@ -0,0 +1,70 @@
+import datetime
+import math
+
+# attribute_type is free text on CategoryAttribute; these are the spellings
+# the app understands, anything else is stored as a plain string
+
+NUMBER_TYPES = {'number', 'float', 'decimal', 'double'}
+INTEGER_TYPES = {'integer', 'int'}
+DATE_TYPES = {'date'}
+DATETIME_TYPES = {'datetime', 'timestamp'}
+BOOLEAN_TYPES = {'boolean', 'bool'}
+
+BOOLEAN_VALUES = {'true': 'true', '1': 'true', 'yes': 'true', 'false': 'false', '0': 'false', 'no': 'false'}
+
+# ItemAttributeValue.value is a String(255)
+MAX_VALUE_LENGTH = 255
+
+
+def normalize_type(attribute_type):
+    return (attribute_type or '').strip().lower()
+
+
+def parse_value(attribute_type, value):
+    # returns the value as it should be stored, raises ValueError if it does not fit the type
+    value = str(value).strip()
+    kind = normalize_type(attribute_type)
+
+    if kind in NUMBER_TYPES:
+        if not math.isfinite(float(value)):
+            raise ValueError(f'{value!r} is not a finite number')
+    elif kind in INTEGER_TYPES:
+        int(value)
+    elif kind in DATE_TYPES:
+        datetime.date.fromisoformat(value)
+    elif kind in DATETIME_TYPES:
+        datetime.datetime.fromisoformat(value)
+    elif kind in BOOLEAN_TYPES:
+        if value.lower() not in BOOLEAN_VALUES:
+            raise ValueError(f'{value!r} is not a boolean')
+        value = BOOLEAN_VALUES[value.lower()]
+
+    if len(value) > MAX_VALUE_LENGTH:
+        raise ValueError(f'value is longer than {MAX_VALUE_LENGTH} characters')
+    return value
+
+
+def typed_columns(attribute_type, value):
+    # numeric and date shadow columns of an ItemAttributeValue, None when the
+    # stored string does not parse as the attribute type
+    kind = normalize_type(attribute_type)
+    value = str(value).strip()
+    number_value = date_value = None
+
+    try:
+        if kind in NUMBER_TYPES or kind in INTEGER_TYPES:
+            number_value = float(value)
+            if not math.isfinite(number_value):
+                number_value = None
+        elif kind in BOOLEAN_TYPES:
+            number_value = 1.0 if BOOLEAN_VALUES[value.lower()] == 'true' else 0.0
+        elif kind in DATE_TYPES:
+            date_value = datetime.datetime.combine(datetime.date.fromisoformat(value), datetime.time())
+        elif kind in DATETIME_TYPES:
+            date_value = datetime.datetime.fromisoformat(value)
+            if date_value.tzinfo is not None:
+                date_value = date_value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    except (ValueError, KeyError):
+        pass
+
+    return {'number_value': number_value, 'date_value': date_value}
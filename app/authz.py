@@ -0,0 +1,85 @@
+from collections import namedtuple
+from app.caching import TTLCache
+from app.models import Follow, User
+
+# shared authorization layer: follow edges and user lookups are cached per
+# process in small TTL+LRU caches, so repeated permission checks from the
+# same client do not hit the database on every request
+
+# cached user data, never an ORM instance bound to some request's session
+CachedUser = namedtuple('CachedUser', ['id', 'email'])
+
+follow_cache = TTLCache('follow')
+user_cache = TTLCache('user')
+
+# "not following" answers expire sooner: a new follow is only invalidated in
+# the worker that handled it, the others pick it up after this many seconds
+negative_ttl = 5
+
+
+def init_app(app):
+    global negative_ttl
+    for cache in (follow_cache, user_cache):
+        cache.maxsize = app.config['AUTHZ_CACHE_SIZE']
+        cache.ttl = app.config['AUTHZ_CACHE_TTL']
+        cache.clear()
+    negative_ttl = app.config['AUTHZ_NEGATIVE_TTL']
+
+
+def is_following(follower_id, followed_id):
+    key = (int(follower_id), int(followed_id))
+    following = follow_cache.get(key)
+    if following is None:
+        following = Follow.query.filter_by(follower_id=key[0], followed_id=key[1]).first() is not None
+        follow_cache.set(key, following, ttl=None if following else negative_ttl)
+    return following
+
+
+def follow_changed(follower_id, followed_id):
+    # call after writing or deleting a follow edge
+    follow_cache.invalidate((int(follower_id), int(followed_id)))
+
+
+def get_user(user_id):
+    key = int(user_id)
+    user = user_cache.get(key)
+    if user is None:
+        row = User.query.with_entities(User.id, User.email).filter_by(id=key).first()
+        if row is None:
+            return None
+        user = CachedUser(row.id, row.email)
+        user_cache.set(key, user)
+    return user
+
+
+def get_user_by_email(email):
+    key = ('email', email)
+    user = user_cache.get(key)
+    if user is None:
+        row = User.query.with_entities(User.id, User.email).filter_by(email=email).first()
+        if row is None:
+            return None
+        user = CachedUser(row.id, row.email)
+        user_cache.set(key, user)
+    return user
+
+
+def get_users(user_ids):
+    # cached users in the given order, loading all misses in one query
+    found = {}
+    missing = []
+    for user_id in user_ids:
+        user = user_cache.get(int(user_id))
+        if user is None:
+            missing.append(int(user_id))
+        else:
+            found[user.id] = user
+    if missing:
+        for row in User.query.with_entities(User.id, User.email).filter(User.id.in_(missing)):
+            found[row.id] = CachedUser(row.id, row.email)
+            user_cache.set(row.id, found[row.id])
+    return [found[int(user_id)] for user_id in user_ids if int(user_id) in found]
+
+
+def stats():
+    return {cache.name: cache.stats() for cache in (follow_cache, user_cache)}
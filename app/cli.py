@@ -0,0 +1,24 @@
+import click
+from flask.cli import ScriptInfo
+
+# `flask db ...` of Flask-Migrate. Importing it pulls in alembic (~0.2 s per
+# process) which no web worker needs, so it is only set up once a db command
+# runs: the real group of Flask-Migrate takes over when the CLI parses `db`.
+
+
+class MigrateGroup(click.Group):
+    def __init__(self, db, **kwargs):
+        super().__init__('db', help='Perform database migrations.', **kwargs)
+        self.db = db
+
+    def _group(self, ctx):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as group
+
+        app = ctx.ensure_object(ScriptInfo).load_app()
+        if 'migrate' not in app.extensions:
+            Migrate(app, self.db)
+        return group
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        return self._group(parent).make_context(info_name, args, parent=parent, **extra)
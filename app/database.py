@@ -0,0 +1,107 @@
+import contextvars
+import os
+from functools import partial
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# engine and connection settings of the configured database: pool sizing for
+# server databases, per-connection pragmas for SQLite so several gunicorn
+# workers can write to one file without failing on "database is locked"
+
+# async drivers for the ASGI serving mode of app/asgi.py
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg', 'mysql': 'aiomysql'}
+
+# sync facades of the async engines while app/asgi.py serves a request,
+# keyed like db.engines; replication.RoutingSession binds to them
+_async_engines = contextvars.ContextVar('async_engines', default=None)
+
+
+def default_uri(instance_path):
+    return 'sqlite:///' + os.path.join(instance_path, 'collecto.sqlite')
+
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def engine_options(config):
+    # explicit SQLALCHEMY_ENGINE_OPTIONS win over the DB_* settings
+    options = {}
+    if not is_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        options = {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        }
+    return {**options, **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+
+
+def sqlite_pragmas(config):
+    return [
+        f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size = {int(config['SQLITE_CACHE_SIZE'])}",
+        # off by default in SQLite, deletes rely on ON DELETE CASCADE
+        'PRAGMA foreign_keys = ON',
+    ]
+
+
+def _apply_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in pragmas:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def init_app(app, db):
+    # call after db.init_app, before the first connection is made
+    pragmas = sqlite_pragmas(app.config)
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', partial(_apply_pragmas, pragmas))
+
+
+def async_uri(uri):
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'no async driver known for {backend}')
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}').render_as_string(hide_password=False)
+
+
+def create_async_engines(app):
+    # primary and replica engines for app/asgi.py, call after replication.init_app
+    from sqlalchemy.ext.asyncio import create_async_engine
+    config = app.config
+    uris = {None: config['ASYNC_DATABASE_URI'] or async_uri(config['SQLALCHEMY_DATABASE_URI'])}
+    for key, uri in zip(app.extensions['replicas'], config['DB_REPLICA_URIS']):
+        uris[key] = async_uri(uri)
+
+    options = engine_options(config)
+    pragmas = sqlite_pragmas(config)
+    engines = {}
+    for key, uri in uris.items():
+        engines[key] = create_async_engine(uri, **options)
+        if engines[key].dialect.name == 'sqlite':
+            event.listen(engines[key].sync_engine, 'connect', partial(_apply_pragmas, pragmas))
+    return engines
+
+
+def use_async_engines(engines):
+    # returns a token for reset_async_engines
+    return _async_engines.set({key: engine.sync_engine for key, engine in engines.items()})
+
+
+def reset_async_engines(token):
+    _async_engines.reset(token)
+
+
+def async_engines():
+    return _async_engines.get()
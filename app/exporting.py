@@ -0,0 +1,177 @@
+import csv
+import io
+import json
+import tempfile
+import time
+from flask import has_request_context, stream_template
+from app import metrics
+from app import repository
+from app.models import Item
+
+# export pipeline: items are read in keyset batches with attribute names
+# resolved once per category, and every format is produced as a stream of
+# chunks instead of one in-memory document
+
+BATCH_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+
+# exports below this size stay in memory, larger ones spill to disk
+SPOOL_SIZE = 8 * 1024 * 1024
+
+FORMATS = {
+    'pdf': 'application/pdf',
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def iter_items(owner_id, category_id, names, batch_size=BATCH_SIZE, on_batch=None):
+    # serialized items (repository.serialize_rows) read in keyset batches of
+    # plain rows, which never enter the session, so memory stays flat
+    last_id = 0
+    while True:
+        batch = (
+            repository.item_rows_query(owner_id, category_id)
+            .filter(Item.id > last_id)
+            .order_by(Item.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            return
+
+        yield from repository.serialize_rows(batch, names)
+        last_id = batch[-1].id
+        if on_batch:
+            on_batch(len(batch))
+
+
+def iter_csv(owner_id, category_id, names, on_batch=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data
+
+    writer.writerow(['id'] + list(names.values()))
+    yield flush()
+
+    for item in iter_items(owner_id, category_id, names, on_batch=on_batch):
+        by_field = {val['field_id']: val['value'] for val in item['values']}
+        writer.writerow([item['id']] + [by_field.get(field_id, '') for field_id in names])
+        yield flush()
+
+
+def iter_ndjson(owner_id, category_id, names, on_batch=None):
+    for item in iter_items(owner_id, category_id, names, on_batch=on_batch):
+        yield json.dumps(item) + '\n'
+
+
+def iter_collection_json(owner, categories, attributes, rows):
+    # one JSON document {"user", "categories": [{..., "items": [...]}]} written
+    # piece by piece while rows (repository.collection_values) are consumed
+    names = {attr.id: attr.name for attr in attributes}
+    by_category = {}
+    for attr in attributes:
+        by_category.setdefault(attr.category_id, []).append(
+            {'id': attr.id, 'name': attr.name, 'attribute_type': attr.attribute_type})
+
+    buffer = io.StringIO()
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data
+
+    rows = iter(rows)
+    row = next(rows, None)
+    buffer.write('{"user": %s, "categories": [' % json.dumps(owner))
+    for category_index, category in enumerate(categories):
+        if category_index:
+            buffer.write(', ')
+        header = {'id': category.id, 'name': category.name, 'attributes': by_category.get(category.id, [])}
+        buffer.write(json.dumps(header)[:-1] + ', "items": [')
+
+        # rows of items whose category is gone would never match, skip them
+        while row is not None and row.category_id < category.id:
+            row = next(rows, None)
+
+        first = True
+        while row is not None and row.category_id == category.id:
+            item = {'id': row.id, 'values': []}
+            while row is not None and row.category_id == category.id and row.id == item['id']:
+                if row.field_id is not None:
+                    item['values'].append({'attribute_name': names.get(row.field_id), 'value': row.value})
+                row = next(rows, None)
+            buffer.write(json.dumps(item) if first else ', ' + json.dumps(item))
+            first = False
+            if buffer.tell() >= CHUNK_SIZE:
+                yield flush()
+        buffer.write(']}')
+    buffer.write(']}')
+    yield flush()
+
+
+def render_pdf(owner_id, category, names, dest=None, on_batch=None):
+    # render the template chunk by chunk into a spooled file, never one string
+    html = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    chunks = stream_template(
+        'export.html',
+        items=iter_items(owner_id, category.id, names, on_batch=on_batch),
+        category_id=category.id,
+        name=category.name,
+        names=names
+    )
+    for chunk in chunks:
+        html.write(chunk.encode('utf-8'))
+    html.seek(0)
+
+    pdf = dest if dest is not None else tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    # xhtml2pdf pulls in reportlab, PIL and pyhanko, about a second of
+    # imports, so only processes that render a PDF pay for it
+    from xhtml2pdf import pisa
+
+    started = time.perf_counter()
+    pisa_status = pisa.CreatePDF(html, dest=pdf, encoding='utf-8')
+    html.close()
+    # export jobs report their render time back to the web process, see app/jobs.py
+    if has_request_context():
+        metrics.observe_pdf_render(time.perf_counter() - started, 'request')
+
+    if pisa_status.err:
+        if dest is None:
+            pdf.close()
+        return None
+
+    if dest is None:
+        pdf.seek(0)
+    return pdf
+
+
+def write_export(owner_id, category, names, export_format, dest, on_batch=None):
+    # write a whole export into an open binary file, returns False on failure
+    if export_format == 'pdf':
+        return render_pdf(owner_id, category, names, dest=dest, on_batch=on_batch) is not None
+
+    if export_format == 'csv':
+        chunks = iter_csv(owner_id, category.id, names, on_batch=on_batch)
+    else:
+        chunks = iter_ndjson(owner_id, category.id, names, on_batch=on_batch)
+    for chunk in chunks:
+        dest.write(chunk.encode('utf-8'))
+    return True
+
+
+def iter_file(f, chunk_size=CHUNK_SIZE):
+    try:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        f.close()
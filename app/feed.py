@@ -0,0 +1,181 @@
+from flask import current_app
+from sqlalchemy import bindparam, func, insert, select, update
+from app import db
+from app import authz
+from app import repository
+from app.models import Activity, CategoryAttribute, Follow, Item, TimelineEntry, User, utcnow
+
+# activity feed of followed users. Every item creation or update is an
+# Activity row. Most users read their feed by merging the activities of the
+# people they follow at request time (fan-out on read). Users following at
+# least FEED_TIMELINE_MIN_FOLLOWING others get a precomputed timeline that
+# writes are copied into (fan-out on write), except the writes of users with
+# more than FEED_FANOUT_MAX_FOLLOWERS followers: those stay unfanned and are
+# merged into every timeline on read. Timelines keep the newest
+# FEED_TIMELINE_SIZE entries, older ones are trimmed as new ones arrive.
+
+
+def follower_count(user_id):
+    return db.session.query(func.count(Follow.id)).filter(Follow.followed_id == user_id).scalar()
+
+
+def following_count(user_id):
+    return db.session.query(func.count(Follow.id)).filter(Follow.follower_id == user_id).scalar()
+
+
+def record(actor_id, category_id, item_ids, verb):
+    # call in the transaction that creates or updates the items
+    if not item_ids:
+        return
+    now = utcnow()
+    fanned_out = follower_count(actor_id) <= current_app.config['FEED_FANOUT_MAX_FOLLOWERS']
+    activity_ids = db.session.execute(
+        insert(Activity).returning(Activity.id),
+        [
+            {'actor_id': actor_id, 'item_id': item_id, 'category_id': category_id,
+             'verb': verb, 'created_at': now, 'fanned_out': fanned_out}
+            for item_id in item_ids
+        ]
+    ).scalars().all()
+
+    if verb == 'updated':
+        db.session.execute(update(Item).where(Item.id.in_(item_ids)).values(updated_at=now))
+
+    if fanned_out:
+        # copy into the timelines of followers that have one
+        db.session.execute(insert(TimelineEntry).from_select(
+            ['user_id', 'activity_id'],
+            select(Follow.follower_id, Activity.id)
+            .join(User, User.id == Follow.follower_id)
+            .join(Activity, Activity.actor_id == Follow.followed_id)
+            .where(Follow.followed_id == actor_id, User.feed_timeline.is_(True), Activity.id.in_(activity_ids))
+        ))
+        _trim(
+            select(Follow.follower_id)
+            .join(User, User.id == Follow.follower_id)
+            .where(Follow.followed_id == actor_id, User.feed_timeline.is_(True))
+        )
+
+
+def _trim(user_ids):
+    # drop the entries behind the newest FEED_TIMELINE_SIZE of each timeline:
+    # one query for the cutoffs, one executemany for the deletes
+    oldest_kept = (
+        select(TimelineEntry.activity_id)
+        .where(TimelineEntry.user_id == User.id)
+        .order_by(TimelineEntry.activity_id.desc())
+        .offset(current_app.config['FEED_TIMELINE_SIZE'] - 1)
+        .limit(1)
+        .scalar_subquery()
+    )
+    cutoffs = [
+        {'timeline_user_id': user_id, 'cutoff': cutoff}
+        for user_id, cutoff in db.session.execute(select(User.id, oldest_kept).where(User.id.in_(user_ids)))
+        if cutoff is not None
+    ]
+    if cutoffs:
+        entries = TimelineEntry.__table__
+        db.session.execute(
+            entries.delete().where(
+                entries.c.user_id == bindparam('timeline_user_id'),
+                entries.c.activity_id < bindparam('cutoff'),
+            ),
+            cutoffs
+        )
+
+
+def _backfill(user_id, actor_ids):
+    # newest fanned out activities of actor_ids that are not in the timeline yet
+    existing = select(TimelineEntry.activity_id).where(TimelineEntry.user_id == user_id)
+    recent = (
+        select(Activity.id)
+        .where(Activity.actor_id.in_(actor_ids), Activity.fanned_out.is_(True), Activity.id.not_in(existing))
+        .order_by(Activity.id.desc())
+        .limit(current_app.config['FEED_TIMELINE_SIZE'])
+        .subquery()
+    )
+    db.session.execute(insert(TimelineEntry).from_select(
+        ['user_id', 'activity_id'],
+        select(db.literal(user_id), recent.c.id)
+    ))
+    _trim([user_id])
+
+
+def follow_added(follower_id, followed_id):
+    # call after committing a new follow edge; builds the timeline once the
+    # follower crosses the threshold, extends it afterwards
+    user = db.session.get(User, follower_id)
+    if user.feed_timeline:
+        _backfill(follower_id, [followed_id])
+    elif following_count(follower_id) >= current_app.config['FEED_TIMELINE_MIN_FOLLOWING']:
+        user.feed_timeline = True
+        _backfill(follower_id, select(Follow.followed_id).where(Follow.follower_id == follower_id))
+    else:
+        return
+    db.session.commit()
+
+
+def _newest(query, before, limit):
+    if before is not None:
+        query = query.where(Activity.id < before)
+    return db.session.execute(query.order_by(Activity.id.desc()).limit(limit)).scalars().all()
+
+
+def activity_ids(user_id, limit, before=None):
+    # ids of the newest activities of the user's feed, newest first
+    followed = select(Follow.followed_id).where(Follow.follower_id == user_id)
+    has_timeline = db.session.query(User.feed_timeline).filter_by(id=user_id).scalar()
+    if not has_timeline:
+        return _newest(select(Activity.id).where(Activity.actor_id.in_(followed)), before, limit)
+
+    # merge on read: precomputed entries plus activities that were never fanned out
+    timeline = _newest(
+        select(Activity.id).join(TimelineEntry, TimelineEntry.activity_id == Activity.id)
+        .where(TimelineEntry.user_id == user_id),
+        before, limit
+    )
+    unfanned = _newest(
+        select(Activity.id).where(Activity.actor_id.in_(followed), Activity.fanned_out.is_(False)),
+        before, limit
+    )
+    return sorted(set(timeline) | set(unfanned), reverse=True)[:limit]
+
+
+def page(user_id, limit, before=None):
+    # (entries, last activity id or None when this is the last page)
+    ids = activity_ids(user_id, limit + 1, before)
+    last_id = ids[limit - 1] if len(ids) > limit else None
+    ids = ids[:limit]
+    if not ids:
+        return [], None
+
+    # plain rows throughout, nothing is loaded into the session
+    activities = (
+        db.session.query(Activity.id, Activity.verb, Activity.created_at, Activity.actor_id,
+                         Activity.item_id, Activity.category_id)
+        .filter(Activity.id.in_(ids))
+        .order_by(Activity.id.desc())
+        .all()
+    )
+    item_rows = db.session.query(Item.id, Item.category_id).filter(Item.id.in_({a.item_id for a in activities})).all()
+    names = dict(
+        db.session.query(CategoryAttribute.id, CategoryAttribute.name)
+        .filter(CategoryAttribute.category_id.in_({a.category_id for a in activities}))
+    )
+    items = {item['id']: item for item in repository.serialize_rows(item_rows, names)}
+    owners = {user.id: user for user in authz.get_users({a.actor_id for a in activities})}
+
+    entries = []
+    for activity in activities:
+        item = items.get(activity.item_id)
+        if item is None:
+            continue
+        owner = owners.get(activity.actor_id)
+        entries.append({
+            'id': activity.id,
+            'verb': activity.verb,
+            'created_at': activity.created_at,
+            'owner': {'id': activity.actor_id, 'email': owner.email if owner else None},
+            'item': item
+        })
+    return entries, last_id
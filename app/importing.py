@@ -0,0 +1,175 @@
+import csv
+import io
+import json
+import time
+from app import db
+from app import feed
+from app import repository
+from app import search
+from app import versioning
+from app.attribute_types import parse_value
+
+# import pipeline: uploads are parsed as a stream, validated row by row and
+# written in fixed-size batches, so memory does not grow with the file size
+
+BATCH_SIZE = 1000
+
+# per-row errors kept in the report, the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+# columns that come from our own exports and are not attributes
+IGNORED_COLUMNS = {'id', 'category_id'}
+
+# unknown column names kept in the report
+MAX_IGNORED_COLUMNS = 100
+
+
+def _text(stream, **kwargs):
+    # undecodable bytes become lone surrogates, so one bad line is reported
+    # as a row error instead of aborting the import
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', errors='surrogateescape', **kwargs)
+
+
+def _valid_utf8(text):
+    try:
+        text.encode('utf-8')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def iter_csv_records(stream):
+    reader = csv.reader(_text(stream, newline=''))
+    try:
+        header = next(reader, None)
+    except csv.Error as e:
+        yield reader.line_num, None, f'invalid CSV header: {e}'
+        return
+    if header is None:
+        return
+    if not all(_valid_utf8(name) for name in header):
+        yield reader.line_num, None, 'invalid UTF-8 in the header'
+        return
+
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # e.g. a field over csv.field_size_limit()
+            yield reader.line_num, None, f'invalid CSV: {e}'
+            continue
+        if not row:
+            continue
+        if not all(_valid_utf8(field) for field in row):
+            yield reader.line_num, None, 'invalid UTF-8'
+            continue
+        if len(row) != len(header):
+            yield reader.line_num, None, f'expected {len(header)} columns, got {len(row)}'
+            continue
+        yield reader.line_num, dict(zip(header, row)), None
+
+
+def iter_ndjson_records(stream):
+    for line_no, line in enumerate(_text(stream), start=1):
+        if not line.strip():
+            continue
+        if not _valid_utf8(line):
+            yield line_no, None, 'invalid UTF-8'
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, None, 'invalid JSON'
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, 'expected a JSON object'
+            continue
+
+        # accept the shape produced by the NDJSON export as well as flat objects
+        if isinstance(record.get('values'), list):
+            record = {
+                val.get('attribute_name'): val.get('value')
+                for val in record['values'] if isinstance(val, dict)
+            }
+        yield line_no, record, None
+
+
+def import_records(owner_id, attributes, records):
+    # attributes: CategoryAttribute rows of the target category
+    by_name = {attr.name: attr for attr in attributes}
+    category_id = attributes[0].category_id if attributes else None
+
+    report = {
+        'imported': 0,
+        'failed': 0,
+        'errors': [],
+        'errors_truncated': False,
+        'ignored_columns': set()
+    }
+    pending = []
+    start = time.perf_counter()
+
+    def fail(line_no, error):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line_no, 'error': error})
+        else:
+            report['errors_truncated'] = True
+
+    def flush():
+        ids = repository.insert_items(owner_id, category_id, len(pending))
+        repository.insert_values([
+            repository.value_row(item_id, attr.id, value, attr.attribute_type)
+            for item_id, values in zip(ids, pending)
+            for attr, value in values
+        ])
+        search.reindex(ids)
+        feed.record(owner_id, category_id, ids, 'created')
+        versioning.bump(category_id)
+        db.session.commit()
+        report['imported'] += len(pending)
+        pending.clear()
+
+    for line_no, record, error in records:
+        if error:
+            fail(line_no, error)
+            continue
+
+        values = []
+        for column, raw in record.items():
+            attr = by_name.get(column)
+            if attr is None:
+                ignored = report['ignored_columns']
+                if column not in IGNORED_COLUMNS and len(ignored) < MAX_IGNORED_COLUMNS:
+                    ignored.add(column)
+                continue
+            if raw is None or raw == '':
+                continue
+            if isinstance(raw, (dict, list)):
+                error = f'{column}: expected a string, number or boolean'
+                break
+            try:
+                values.append((attr, parse_value(attr.attribute_type, raw)))
+            except ValueError as e:
+                error = f'{column}: {e}'
+                break
+
+        if error:
+            fail(line_no, error)
+        elif not values:
+            fail(line_no, 'row has no attribute values')
+        else:
+            pending.append(values)
+            if len(pending) >= BATCH_SIZE:
+                flush()
+
+    if pending:
+        flush()
+
+    elapsed = time.perf_counter() - start
+    report['ignored_columns'] = sorted(report['ignored_columns'], key=str)
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round((report['imported'] + report['failed']) / elapsed, 1) if elapsed else None
+    return report
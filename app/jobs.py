@@ -0,0 +1,221 @@
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from flask import current_app
+from app import db
+from app import metrics
+from app.models import Category, Item
+
+# export jobs: rendering runs in a local process pool, and job state plus the
+# finished artifacts live on disk so every web worker on the machine sees them
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'pdf': 'pdf', 'csv': 'csv', 'ndjson': 'ndjson'}
+
+# config keys forwarded to the worker processes
+WORKER_CONFIG_KEYS = ('SQLALCHEMY_DATABASE_URI', 'EXPORT_CACHE_DIR')
+
+_executor = None
+
+# app instance of a worker process, created once by the pool initializer
+_worker_app = None
+
+
+def export_dir():
+    path = current_app.config['EXPORT_CACHE_DIR'] or os.path.join(current_app.instance_path, 'exports')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def data_version(category_id):
+    # Category.version is bumped by every item and attribute write
+    return db.session.query(Category.version).filter_by(id=category_id).scalar()
+
+
+def job_id_for(category_id, export_format, version):
+    return f'{category_id}-{export_format}-{version}'
+
+
+def artifact_path(directory, job_id, export_format):
+    return os.path.join(directory, f'{job_id}.{EXTENSIONS[export_format]}')
+
+
+def status_path(directory, job_id):
+    return os.path.join(directory, f'{job_id}.json')
+
+
+def read_status(directory, job_id):
+    # job ids come from the url, keep them inside the export directory
+    if os.path.basename(job_id) != job_id:
+        return None
+    try:
+        with open(status_path(directory, job_id)) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if status['state'] in ('queued', 'running') and not _alive(status.get('pid')):
+        # left behind by a killed worker or a restarted server
+        status['state'] = 'failed'
+        status['error'] = 'export worker stopped'
+    return status
+
+
+def _alive(pid):
+    # queued jobs carry the pid of the web process owning the pool, running
+    # ones that of their worker; status files are local to the machine
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def write_status(directory, status):
+    path = status_path(directory, status['id'])
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(status, f)
+    os.replace(tmp, path)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        config = {key: current_app.config[key] for key in WORKER_CONFIG_KEYS}
+        config['EXPORT_CACHE_DIR'] = export_dir()
+        _executor = ProcessPoolExecutor(
+            max_workers=current_app.config['EXPORT_WORKERS'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(config,)
+        )
+    return _executor
+
+
+def _reset_executor(broken):
+    # a killed worker breaks the whole pool for good
+    global _executor
+    if _executor is broken:
+        _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def submit_export(owner_id, category_id, export_format):
+    # returns the job status, reusing a finished or running job for unchanged data
+    directory = export_dir()
+    job_id = job_id_for(category_id, export_format, data_version(category_id))
+
+    status = read_status(directory, job_id)
+    if status and status['state'] != 'failed':
+        return status
+
+    status = {
+        'id': job_id,
+        'owner_id': owner_id,
+        'category_id': category_id,
+        'format': export_format,
+        'state': 'queued',
+        'pid': os.getpid(),
+        'done': 0,
+        'total': Item.query.filter_by(owner_id=owner_id, category_id=category_id).count(),
+        'error': None
+    }
+    write_status(directory, status)
+
+    executor = get_executor()
+    try:
+        future = executor.submit(run_export, dict(status))
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        future = get_executor().submit(run_export, dict(status))
+    future.add_done_callback(partial(_job_done, directory, status))
+    return status
+
+
+def _job_done(directory, status, future):
+    if future.exception() is not None:
+        logger.error('export worker crashed', exc_info=future.exception())
+        status = read_status(directory, status['id']) or status
+        status['state'] = 'failed'
+        status['error'] = f'export worker crashed: {future.exception()!r}'
+        write_status(directory, status)
+    elif future.result() is not None:
+        metrics.observe_pdf_render(future.result(), 'job')
+
+
+def _init_worker(config):
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app(config)
+
+
+def run_export(status):
+    # runs inside a pool process, returns the render time of PDF jobs
+    from app import exporting
+    from app import repository
+
+    directory = _worker_app.config['EXPORT_CACHE_DIR']
+    path = artifact_path(directory, status['id'], status['format'])
+
+    def on_batch(count):
+        status['done'] += count
+        write_status(directory, status)
+
+    with _worker_app.app_context():
+        try:
+            status['state'] = 'running'
+            status['pid'] = os.getpid()
+            write_status(directory, status)
+
+            category = Category.query.get(status['category_id'])
+            names = repository.attribute_names(category.id)
+            started = time.perf_counter()
+            with open(f'{path}.part', 'wb') as f:
+                ok = exporting.write_export(status['owner_id'], category, names, status['format'], f, on_batch)
+            elapsed = time.perf_counter() - started
+            if not ok:
+                raise RuntimeError('PDF generation failed')
+
+            os.replace(f'{path}.part', path)
+            status['state'] = 'done'
+            write_status(directory, status)
+            _remove_stale(directory, status)
+            return elapsed if status['format'] == 'pdf' else None
+        except Exception as e:
+            logger.exception('export job %s failed', status['id'])
+            status['state'] = 'failed'
+            status['error'] = str(e)
+            write_status(directory, status)
+        finally:
+            db.session.remove()
+
+
+def _remove_stale(directory, status):
+    # artifacts of older data versions of the same category and format
+    pattern = os.path.join(directory, f"{status['category_id']}-{status['format']}-*")
+    for path in glob.glob(pattern):
+        if not os.path.basename(path).startswith(status['id'] + '.'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def forget_category(category_id):
+    # call when deleting a category: its jobs and artifacts of every format and version
+    for path in glob.glob(os.path.join(export_dir(), f'{category_id}-*')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,308 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# per-request instrumentation: latency per endpoint from the request
+# lifecycle, statement counts, time and rows from engine events, PDF render
+# time from app/exporting.py. Served in the Prometheus text format on
+# /metrics; like the caches, the numbers are per worker process.
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+RENDER_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        for values, total in series:
+            yield f'{self.name}{_labels(self.labels, values)} {_number(total)}'
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, description, buckets, labels=()):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.labels = labels
+        # labels -> [count per bucket (the last one is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = sorted((values, (list(counts), total)) for values, (counts, total) in self._series.items())
+        for values, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                labels = _labels(self.labels, values, [('le', bound)])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labels, values)} {_number(total)}'
+            yield f'{self.name}_count{_labels(self.labels, values)} {cumulative}'
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+ENDPOINT_LABELS = ('namespace', 'endpoint', 'method')
+
+requests_total = Counter(
+    'collecto_http_requests_total', 'Finished requests',
+    ENDPOINT_LABELS + ('status',))
+request_seconds = Histogram(
+    'collecto_http_request_duration_seconds', 'Request latency, streamed bodies included',
+    LATENCY_BUCKETS, ENDPOINT_LABELS)
+request_queries = Histogram(
+    'collecto_db_queries_per_request', 'SQL statements issued by one request',
+    QUERY_COUNT_BUCKETS, ENDPOINT_LABELS)
+queries_total = Counter(
+    'collecto_db_queries_total', 'SQL statements issued by requests', ENDPOINT_LABELS)
+query_seconds_total = Counter(
+    'collecto_db_query_seconds_total', 'Time spent executing SQL statements', ENDPOINT_LABELS)
+rows_total = Counter(
+    'collecto_db_rows_total', 'Rows fetched from SELECT results plus rows changed by DML',
+    ENDPOINT_LABELS)
+slow_requests_total = Counter(
+    'collecto_slow_requests_total', 'Requests over a METRICS_SLOW_* threshold', ENDPOINT_LABELS)
+pdf_render_seconds = Histogram(
+    'collecto_pdf_render_seconds', 'xhtml2pdf render time of PDF exports',
+    RENDER_BUCKETS, ('mode',))
+
+REGISTRY = (
+    requests_total, request_seconds, request_queries, queries_total, query_seconds_total,
+    rows_total, slow_requests_total, pdf_render_seconds,
+)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.description}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def clear():
+    for metric in REGISTRY:
+        metric.clear()
+
+
+def observe_pdf_render(seconds, mode):
+    pdf_render_seconds.observe(seconds, (mode,))
+
+
+class RequestStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.status = None
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.rows = 0
+        # statement text -> [executions, seconds]
+        self.statements = {}
+
+    def add_statement(self, statement, seconds):
+        self.queries += 1
+        self.query_seconds += seconds
+        entry = self.statements.get(statement)
+        if entry is None:
+            entry = self.statements[statement] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def top_statements(self, count):
+        return sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)[:count]
+
+
+class _CountingCursor:
+    # DBAPI cursor wrapper counting the rows handed to the SQLAlchemy result
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._stats.rows += 1
+            yield row
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+
+def _current_stats():
+    if not has_app_context():
+        return None
+    return g.get('request_metrics')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats() is not None:
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats()
+    started = conn.info.get('metrics_started')
+    if stats is None or not started:
+        return
+    stats.add_statement(statement, time.perf_counter() - started.pop())
+
+    if cursor.description is not None:
+        # rows are counted as the result fetches them
+        if context is not None:
+            context.cursor = _CountingCursor(cursor, stats)
+    elif cursor.rowcount > 0:
+        stats.rows += cursor.rowcount
+
+
+def _handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get('metrics_started') if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+_listening = False
+
+
+def _listen_engines():
+    # on the Engine class so the primary and every replica bind are covered
+    global _listening
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _listening = True
+
+
+def _endpoint_labels():
+    rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    namespace = rule.strip('/').split('/', 1)[0] or 'root'
+    return namespace, rule, request.method
+
+
+def _start_request():
+    g.request_metrics = RequestStats()
+
+
+def _remember_status(response):
+    stats = g.get('request_metrics')
+    if stats is not None:
+        stats.status = response.status_code
+    return response
+
+
+def _finish_request(exc):
+    # teardown runs after a streamed body has been sent
+    stats = g.pop('request_metrics', None)
+    if stats is None:
+        return
+    config = current_app.config
+
+    elapsed = time.perf_counter() - stats.start
+    labels = _endpoint_labels()
+    status = stats.status if exc is None and stats.status is not None else 500
+
+    requests_total.inc(labels + (str(status),))
+    request_seconds.observe(elapsed, labels)
+    request_queries.observe(stats.queries, labels)
+    queries_total.inc(labels, stats.queries)
+    query_seconds_total.inc(labels, stats.query_seconds)
+    rows_total.inc(labels, stats.rows)
+
+    slow_seconds = config['METRICS_SLOW_REQUEST_SECONDS']
+    slow_queries = config['METRICS_SLOW_REQUEST_QUERIES']
+    if (slow_seconds is not None and elapsed >= slow_seconds) or \
+            (slow_queries is not None and stats.queries >= slow_queries):
+        slow_requests_total.inc(labels)
+        top = '\n'.join(
+            f'  {count}x {seconds * 1000:.1f} ms  {" ".join(statement.split())[:300]}'
+            for statement, (count, seconds) in stats.top_statements(config['METRICS_SLOW_TOP_STATEMENTS'])
+        )
+        logger.warning(
+            'slow request %s %s -> %s: %.1f ms, %d queries in %.1f ms, %d rows\n%s',
+            request.method, request.path, status, elapsed * 1000,
+            stats.queries, stats.query_seconds * 1000, stats.rows, top
+        )
+
+
+def init_app(app):
+    if not app.config['METRICS']:
+        return
+    _listen_engines()
+    app.before_request(_start_request)
+    app.after_request(_remember_status)
+    app.teardown_request(_finish_request)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return app.response_class(render(), content_type=CONTENT_TYPE)
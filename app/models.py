@@ -1,44 +1,98 @@
+import datetime
 from . import db
 
+def utcnow():
+    # naive UTC, like the other DateTime columns
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(128), nullable=True)
+    # reads /feed from precomputed TimelineEntry rows, set once the user follows many others
+    feed_timeline = db.Column(db.Boolean, nullable=False, default=False, server_default='0')
 
     categories = db.relationship('Category', backref='owner', lazy=True)
     items = db.relationship('Item', backref='owner', lazy=True)
 
 class Category(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('owner_id', 'name', name='uq_category_owner_id_name'),
+        # ids of deleted categories are never reused, ETags and export jobs are keyed by them
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     owner_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_category_owner'), nullable=False)
+    # bumped on every item or attribute write, used for ETags and export caching
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
-    attributes = db.relationship('CategoryAttribute', backref='category', cascade='all, delete', lazy=True)
-    items = db.relationship('Item', backref='category', cascade='all, delete', lazy=True)
+    # children go with ON DELETE CASCADE in the database, the ORM does not load them to delete them
+    attributes = db.relationship('CategoryAttribute', backref='category', cascade='all, delete', passive_deletes=True, lazy=True)
+    items = db.relationship('Item', backref='category', cascade='all, delete', passive_deletes=True, lazy=True)
 
 class CategoryAttribute(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    category_id = db.Column(db.Integer, db.ForeignKey('category.id', name='fk_categoryattribute_category'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id', name='fk_categoryattribute_category', ondelete='CASCADE'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     attribute_type = db.Column(db.String(20), nullable=False)  # 'string', 'number', 'date', etc.
 
 class Item(db.Model):
+    __table_args__ = (
+        db.Index('ix_item_owner_id_category_id', 'owner_id', 'category_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    category_id = db.Column(db.Integer, db.ForeignKey('category.id', name='fk_item_category'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id', name='fk_item_category', ondelete='CASCADE'), nullable=False)
     owner_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_item_owner'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=True, default=utcnow)
+    updated_at = db.Column(db.DateTime, nullable=True, default=utcnow, onupdate=utcnow)
 
-    values = db.relationship('ItemAttributeValue', backref='item', cascade='all, delete', lazy=True)
+    values = db.relationship('ItemAttributeValue', backref='item', cascade='all, delete', passive_deletes=True, lazy=True)
 
 class ItemAttributeValue(db.Model):
+    __table_args__ = (
+        db.Index('ix_item_attribute_value_field_id_number_value', 'field_id', 'number_value'),
+        db.Index('ix_item_attribute_value_field_id_date_value', 'field_id', 'date_value'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    item_id = db.Column(db.Integer, db.ForeignKey('item.id', name='fk_itemattributevalue_item'), nullable=False)
-    field_id = db.Column(db.Integer, db.ForeignKey('category_attribute.id', name='fk_itemattributevalue_field'), nullable=False)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id', name='fk_itemattributevalue_item', ondelete='CASCADE'), nullable=False, index=True)
+    field_id = db.Column(db.Integer, db.ForeignKey('category_attribute.id', name='fk_itemattributevalue_field', ondelete='CASCADE'), nullable=False)
     value = db.Column(db.String(255), nullable=False)  # cast in app logic
+    # typed copies of value, filled according to the attribute type for indexed range queries
+    number_value = db.Column(db.Float, nullable=True)
+    date_value = db.Column(db.DateTime, nullable=True)
 
 class Follow(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('follower_id', 'followed_id', name='uq_follow_follower_id_followed_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     follower_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    followed_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    followed_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
 
     follower = db.relationship('User', foreign_keys=[follower_id], backref='following')
-    followed = db.relationship('User', foreign_keys=[followed_id], backref='followers')
\ No newline at end of file
+    followed = db.relationship('User', foreign_keys=[followed_id], backref='followers')
+
+class Activity(db.Model):
+    # one row per item creation or update, see app/feed.py
+    __table_args__ = (
+        db.Index('ix_activity_actor_id_id', 'actor_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    actor_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_activity_actor'), nullable=False)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id', name='fk_activity_item', ondelete='CASCADE'), nullable=False, index=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id', name='fk_activity_category', ondelete='CASCADE'), nullable=False)
+    verb = db.Column(db.String(16), nullable=False)  # 'created' or 'updated'
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    # False when the actor had too many followers to copy it into timelines
+    fanned_out = db.Column(db.Boolean, nullable=False, default=True, server_default='1')
+
+class TimelineEntry(db.Model):
+    # precomputed feed of a user with feed_timeline set
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_timelineentry_user'), primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity.id', name='fk_timelineentry_activity', ondelete='CASCADE'), primary_key=True, index=True)
@@ -0,0 +1,61 @@
+import base64
+import json
+from flask_restx import reqparse
+
+# keyset pagination keyed on a monotonically increasing id column, so every
+# page is an index range scan no matter how deep the client has paged
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(last_id):
+    raw = json.dumps({'id': last_id}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))['id']
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('invalid cursor')
+    if not isinstance(last_id, int):
+        raise ValueError('invalid cursor')
+    return last_id
+
+
+def page_limit(value):
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, MAX_LIMIT)
+
+
+# shared query parameters, used with @ns.expect(pagination_args)
+pagination_args = reqparse.RequestParser()
+pagination_args.add_argument('limit', type=page_limit, default=DEFAULT_LIMIT, location='args',
+                             help=f'page size (max {MAX_LIMIT})')
+pagination_args.add_argument('cursor', type=decode_cursor, location='args',
+                             help=f'opaque cursor taken from the {NEXT_CURSOR_HEADER} header')
+
+
+def paginate(query, column, args):
+    # fetch one extra row to know whether another page exists
+    limit = args['limit']
+    if args['cursor'] is not None:
+        query = query.filter(column > args['cursor'])
+    rows = query.order_by(column).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(getattr(rows[-1], column.key))
+    return rows, next_cursor
+
+
+def page_headers(next_cursor):
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
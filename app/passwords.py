@@ -0,0 +1,90 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+from flask import current_app
+
+# password hashing off the request workers: bcrypt runs in a small process
+# pool, and requests beyond PASSWORD_HASH_QUEUE waiting hashes are turned away
+# with HashingBusy instead of piling up behind each other
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def _generate(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(hashed, password):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    except ValueError:
+        # not a bcrypt hash
+        return False
+
+
+def get_executor():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=current_app.config['PASSWORD_HASH_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _slots = threading.BoundedSemaphore(current_app.config['PASSWORD_HASH_QUEUE'])
+    return _executor
+
+
+def _reset_executor(broken):
+    # a killed worker breaks the whole pool for good, replace it once
+    global _executor
+    with _lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(executor, fn, args):
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    # the slot stays taken until the worker is done, even if this request gives up
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=current_app.config['PASSWORD_HASH_TIMEOUT'])
+    except TimeoutError:
+        future.cancel()
+        raise HashingBusy()
+
+
+def _run(fn, *args):
+    if not current_app.config['PASSWORD_HASH_WORKERS']:
+        return fn(*args)
+
+    for _ in range(2):
+        executor = get_executor()
+        try:
+            return _submit(executor, fn, args)
+        except BrokenProcessPool:
+            _reset_executor(executor)
+    # the fresh pool broke as well
+    raise HashingBusy()
+
+
+def generate_password_hash(password):
+    return _run(_generate, password, current_app.config['BCRYPT_LOG_ROUNDS'])
+
+
+def check_password_hash(hashed, password):
+    return _run(_check, hashed, password)
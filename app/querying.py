@@ -0,0 +1,193 @@
+import base64
+import datetime
+import json
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import aliased
+from app import db
+from app.attribute_types import normalize_type, typed_columns, NUMBER_TYPES, INTEGER_TYPES, BOOLEAN_TYPES, DATE_TYPES, DATETIME_TYPES
+from app.models import Item, ItemAttributeValue
+
+# attribute query compiler: filters, sort and projection over the
+# entity-attribute-value tables are turned into one SELECT per page
+
+RANGE_OPS = {'eq', 'lt', 'lte', 'gt', 'gte', 'between'}
+TEXT_OPS = {'prefix', 'contains'}
+OPS = RANGE_OPS | TEXT_OPS
+
+
+class QueryError(ValueError):
+    pass
+
+
+def value_column(table, attribute_type):
+    # the column range comparisons and sorting should use for this attribute type
+    kind = normalize_type(attribute_type)
+    if kind in NUMBER_TYPES or kind in INTEGER_TYPES or kind in BOOLEAN_TYPES:
+        return table.number_value
+    if kind in DATE_TYPES or kind in DATETIME_TYPES:
+        return table.date_value
+    return table.value
+
+
+def coerce(attr, raw):
+    # convert a filter operand to the type of the column it is compared with
+    if raw is None:
+        raise QueryError(f'missing value for attribute {attr.id}')
+    column = value_column(ItemAttributeValue, attr.attribute_type)
+    if column is ItemAttributeValue.value:
+        return str(raw)
+
+    typed = typed_columns(attr.attribute_type, raw)
+    result = typed['number_value'] if column is ItemAttributeValue.number_value else typed['date_value']
+    if result is None:
+        raise QueryError(f'{raw!r} is not a valid {attr.attribute_type} for attribute {attr.id}')
+    return result
+
+
+def escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def filter_condition(attr, spec):
+    op = spec.get('op')
+    if op not in OPS:
+        raise QueryError(f'unknown operator {op!r}')
+
+    if op in TEXT_OPS:
+        column = ItemAttributeValue.value
+        pattern = escape_like(str(spec.get('value') or ''))
+        pattern = f'{pattern}%' if op == 'prefix' else f'%{pattern}%'
+        condition = column.like(pattern, escape='\\')
+    else:
+        column = value_column(ItemAttributeValue, attr.attribute_type)
+        if op == 'between':
+            condition = column.between(coerce(attr, spec.get('min')), coerce(attr, spec.get('max')))
+        else:
+            operand = coerce(attr, spec.get('value'))
+            condition = {
+                'eq': column == operand,
+                'lt': column < operand,
+                'lte': column <= operand,
+                'gt': column > operand,
+                'gte': column >= operand,
+            }[op]
+
+    # an IN subquery lets the database drive the filter from the (field_id, typed value) index
+    return Item.id.in_(
+        select(ItemAttributeValue.item_id)
+        .where(ItemAttributeValue.field_id == attr.id, condition)
+    )
+
+
+def encode_cursor(sort_value, last_id):
+    if isinstance(sort_value, datetime.datetime):
+        sort_value = {'dt': sort_value.isoformat()}
+    raw = json.dumps([sort_value, last_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        if isinstance(sort_value, dict):
+            sort_value = datetime.datetime.fromisoformat(sort_value['dt'])
+    except (ValueError, TypeError, KeyError):
+        raise QueryError('invalid cursor')
+    if not isinstance(last_id, int):
+        raise QueryError('invalid cursor')
+    return sort_value, last_id
+
+
+def after_cursor(sort_column, descending, cursor):
+    # keyset condition for (sort value, id) ordering with NULL sort values last
+    sort_value, last_id = decode_cursor(cursor)
+    if sort_column is None:
+        return Item.id > last_id
+    if sort_value is None:
+        return and_(sort_column.is_(None), Item.id > last_id)
+
+    beyond = sort_column < sort_value if descending else sort_column > sort_value
+    return or_(
+        beyond,
+        and_(sort_column == sort_value, Item.id > last_id),
+        sort_column.is_(None)
+    )
+
+
+def build_query(owner_id, category_id, attributes, spec, limit):
+    # attributes: {id: CategoryAttribute} of the category
+    def attribute(field_id):
+        if field_id not in attributes:
+            raise QueryError(f'attribute ID {field_id} does not belong to category {category_id}')
+        return attributes[field_id]
+
+    projected = [attribute(field_id) for field_id in spec.get('fields') or []] or list(attributes.values())
+
+    # one scalar subquery per projected attribute keeps it to one row per item
+    columns = [Item.id]
+    for attr in projected:
+        projected_value = aliased(ItemAttributeValue)
+        columns.append(
+            select(projected_value.value)
+            .where(projected_value.item_id == Item.id, projected_value.field_id == attr.id)
+            .limit(1)
+            .scalar_subquery()
+            .label(f'f{attr.id}')
+        )
+
+    stmt = select(*columns).where(Item.owner_id == owner_id, Item.category_id == category_id)
+
+    for condition in spec.get('filters') or []:
+        stmt = stmt.where(filter_condition(attribute(condition.get('field_id')), condition))
+
+    sort = spec.get('sort') or {}
+    sort_column = None
+    descending = sort.get('direction') == 'desc'
+    if sort.get('field_id') is not None:
+        sort_attr = attribute(sort['field_id'])
+        sort_value = aliased(ItemAttributeValue)
+        # a scalar subquery instead of a join, an item with several values for
+        # the sort attribute stays one row: ascending sorts by its smallest
+        # value, descending by its largest
+        aggregate = func.max if descending else func.min
+        sort_column = (
+            select(aggregate(value_column(sort_value, sort_attr.attribute_type)))
+            .where(sort_value.item_id == Item.id, sort_value.field_id == sort_attr.id)
+            .scalar_subquery()
+        )
+        stmt = stmt.add_columns(sort_column.label('sort_value'))
+        order = sort_column.desc() if descending else sort_column.asc()
+        stmt = stmt.order_by(sort_column.is_(None), order, Item.id)
+    else:
+        stmt = stmt.order_by(Item.id)
+
+    if spec.get('cursor'):
+        stmt = stmt.where(after_cursor(sort_column, descending, spec['cursor']))
+
+    return stmt.limit(limit + 1), projected, sort_column is not None
+
+
+def run_query(owner_id, category_id, attributes, spec, limit):
+    stmt, projected, sorted_by_value = build_query(owner_id, category_id, attributes, spec, limit)
+    rows = db.session.execute(stmt).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.sort_value if sorted_by_value else None, last.id)
+
+    items = [
+        {
+            'id': row.id,
+            'category_id': category_id,
+            'values': [
+                {'attribute_name': attr.name, 'value': row[index], 'field_id': attr.id}
+                for index, attr in enumerate(projected, start=1)
+                if row[index] is not None
+            ]
+        }
+        for row in rows
+    ]
+    return items, next_cursor
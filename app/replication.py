@@ -0,0 +1,117 @@
+import random
+import sqlite3
+import click
+from flask import current_app, g, has_request_context, request
+from flask.cli import with_appcontext
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from app import database
+from app.caching import TTLCache
+
+# read replica routing: reads of GET/HEAD/OPTIONS requests go to one of the
+# DB_REPLICA_URIS binds, everything else uses the primary. A request switches
+# to the primary for good once it writes, and a user who wrote keeps reading
+# from the primary for DB_REPLICA_STICKY_SECONDS so they see their own writes.
+
+READ_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+# users who wrote recently, per process; other workers fall back on replica lag being shorter than the window
+recent_writers = TTLCache('recent_writers', ttl=5)
+
+
+def replica_keys(app):
+    return [f'replica{index}' for index in range(len(app.config['DB_REPLICA_URIS']))]
+
+
+def configure(app):
+    # registers every replica as an extra bind, call before db.init_app
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for key, uri in zip(replica_keys(app), app.config['DB_REPLICA_URIS']):
+        binds[key] = uri
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def init_app(app):
+    recent_writers.ttl = app.config['DB_REPLICA_STICKY_SECONDS']
+    recent_writers.clear()
+    app.extensions['replicas'] = replica_keys(app)
+    app.after_request(_remember_writer)
+    app.cli.add_command(sync_replicas)
+
+
+def _identity():
+    # None when the request carries no verified token (yet)
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+def _mark_primary():
+    if has_request_context():
+        g.db_primary = True
+
+
+def _read_bind(engines):
+    # replica engine for the current request, chosen once per request, or None for the primary
+    if not has_request_context() or g.get('db_primary') or request.method not in READ_METHODS:
+        return None
+    keys = current_app.extensions.get('replicas')
+    if not keys:
+        return None
+    if 'db_replica' not in g:
+        user_id = _identity()
+        sticky = user_id is not None and recent_writers.get(str(user_id)) is not None
+        g.db_replica = None if sticky else random.choice(keys)
+    return engines[g.db_replica] if g.db_replica else None
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # under app/asgi.py the same routing picks among the async engines
+        async_engines = database.async_engines()
+        if bind is None and not self._flushing:
+            if getattr(clause, 'is_dml', False):
+                _mark_primary()
+            else:
+                engine = _read_bind(async_engines or self._db.engines)
+                if engine is not None:
+                    return engine
+        if bind is None and async_engines:
+            return async_engines[None]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    _mark_primary()
+
+
+def _remember_writer(response):
+    if request.method not in READ_METHODS or g.get('db_primary'):
+        user_id = _identity()
+        if user_id is not None and response.status_code < 400:
+            recent_writers.set(str(user_id), True)
+    return response
+
+
+@click.command('sync-replicas')
+@with_appcontext
+def sync_replicas():
+    """Copy a SQLite primary into the SQLite replica files (local testing)."""
+    primary = make_url(current_app.config['SQLALCHEMY_DATABASE_URI'])
+    if primary.get_backend_name() != 'sqlite':
+        raise click.ClickException('only SQLite databases can be copied')
+    source = sqlite3.connect(primary.database)
+    try:
+        for uri in current_app.config['DB_REPLICA_URIS']:
+            target = sqlite3.connect(make_url(uri).database)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+            click.echo(f'copied to {uri}')
+    finally:
+        source.close()
@@ -0,0 +1,146 @@
+from sqlalchemy import func, insert, select
+from app import db
+from app.attribute_types import typed_columns
+from app.models import Category, Item, ItemAttributeValue, CategoryAttribute
+
+# shared item data access: every loader and writer here runs a fixed number
+# of queries no matter how many items or values it handles
+
+
+def attribute_names(category_id):
+    # one query for the whole category instead of one per value
+    rows = (
+        CategoryAttribute.query
+        .with_entities(CategoryAttribute.id, CategoryAttribute.name)
+        .filter_by(category_id=category_id)
+        .order_by(CategoryAttribute.id)
+        .all()
+    )
+    return {attr_id: name for attr_id, name in rows}
+
+
+# read-only projections: plain Row tuples that never enter the session's
+# identity map, for endpoints that only copy a few columns into dicts
+
+def item_rows_query(owner_id, category_id):
+    # (id, category_id) rows, pageable with pagination.paginate
+    return (
+        db.session.query(Item.id, Item.category_id)
+        .filter(Item.owner_id == owner_id, Item.category_id == category_id)
+    )
+
+
+def item_row(item_id, owner_id):
+    return (
+        db.session.query(Item.id, Item.category_id)
+        .filter(Item.id == item_id, Item.owner_id == owner_id)
+        .first()
+    )
+
+
+def value_rows(item_ids, first_only=False):
+    # (item_id, field_id, value) rows of the given items in one query; with
+    # first_only just the earliest value of each item
+    if not item_ids:
+        return []
+    stmt = select(ItemAttributeValue.item_id, ItemAttributeValue.field_id, ItemAttributeValue.value)
+    if first_only:
+        first_ids = (
+            select(func.min(ItemAttributeValue.id))
+            .where(ItemAttributeValue.item_id.in_(item_ids))
+            .group_by(ItemAttributeValue.item_id)
+        )
+        stmt = stmt.where(ItemAttributeValue.id.in_(first_ids))
+    else:
+        stmt = stmt.where(ItemAttributeValue.item_id.in_(item_ids))
+    return db.session.execute(stmt.order_by(ItemAttributeValue.item_id, ItemAttributeValue.id)).all()
+
+
+def category_rows_query(owner_id):
+    # (id, name) rows, pageable with pagination.paginate
+    return db.session.query(Category.id, Category.name).filter(Category.owner_id == owner_id)
+
+
+def attribute_rows(category_id):
+    return (
+        db.session.query(CategoryAttribute.id, CategoryAttribute.name, CategoryAttribute.attribute_type)
+        .filter(CategoryAttribute.category_id == category_id)
+        .order_by(CategoryAttribute.id)
+        .all()
+    )
+
+
+def serialize_rows(item_rows, names, first_only=False, with_field_id=True):
+    # {'id', 'category_id', 'values'} dicts of item rows, their values loaded
+    # in one more query
+    by_item = {}
+    for row in value_rows([item.id for item in item_rows], first_only):
+        by_item.setdefault(row.item_id, []).append(row)
+    return [
+        {
+            'id': item.id,
+            'category_id': item.category_id,
+            'values': serialize_values(by_item.get(item.id, []), names, with_field_id)
+        }
+        for item in item_rows
+    ]
+
+
+def collection(owner_id):
+    # categories and attributes of a user, two queries
+    categories = Category.query.filter_by(owner_id=owner_id).order_by(Category.id).all()
+    attributes = (
+        CategoryAttribute.query
+        .join(Category, Category.id == CategoryAttribute.category_id)
+        .filter(Category.owner_id == owner_id)
+        .order_by(CategoryAttribute.id)
+        .all()
+    )
+    return categories, attributes
+
+
+def collection_values(owner_id, batch_size=1000):
+    # (category_id, item_id, field_id, value) of every item of a user, ordered
+    # by category and item, in one query streamed in batches of plain rows
+    return db.session.execute(
+        select(Item.category_id, Item.id, ItemAttributeValue.field_id, ItemAttributeValue.value)
+        .outerjoin(ItemAttributeValue, ItemAttributeValue.item_id == Item.id)
+        .where(Item.owner_id == owner_id)
+        .order_by(Item.category_id, Item.id, ItemAttributeValue.id)
+        .execution_options(yield_per=batch_size)
+    )
+
+
+def serialize_values(values, names, with_field_id=True):
+    result = []
+    for val in values:
+        data = {
+            'attribute_name': names.get(val.field_id),
+            'value': val.value
+        }
+        if with_field_id:
+            data['field_id'] = val.field_id
+        result.append(data)
+    return result
+
+
+def insert_items(owner_id, category_id, count):
+    # one multi-row INSERT ... RETURNING; the rows are identical until values
+    # are attached, so any id-to-row mapping is valid
+    if not count:
+        return []
+    return sorted(db.session.scalars(
+        insert(Item).returning(Item.id),
+        [{'category_id': category_id, 'owner_id': owner_id} for _ in range(count)]
+    ).all())
+
+
+def value_row(item_id, field_id, value, attribute_type):
+    # insert parameters of one value, including its typed shadow columns
+    return {'item_id': item_id, 'field_id': field_id, 'value': value, **typed_columns(attribute_type, value)}
+
+
+def insert_values(rows):
+    # rows built by value_row, written with one executemany
+    if rows:
+        db.session.execute(insert(ItemAttributeValue), rows)
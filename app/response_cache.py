@@ -0,0 +1,250 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, current_app
+from flask_restx.representations import output_json
+
+# server-side cache of serialized collection pages. Keys are the ETags of
+# versioning.conditional, i.e. derived from (user, category, version, query),
+# so a write never has to find the entries it made stale: the next read simply
+# misses. invalidate() only frees their space early.
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    # per-process LRU bounded by the total size of the cached bodies
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> (category_id, headers, body)
+        self._by_category = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[1], entry[2]
+
+    def set(self, key, category_id, headers, body):
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (category_id, headers, body)
+            self._by_category.setdefault(category_id, set()).add(key)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                self._pop(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, category_id):
+        with self._lock:
+            for key in list(self._by_category.get(category_id, ())):
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._by_category.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[2])
+            keys = self._by_category[entry[0]]
+            keys.discard(key)
+            if not keys:
+                del self._by_category[entry[0]]
+
+    def stats(self):
+        return {'entries': len(self._data), 'bytes': self.size, 'max_bytes': self.max_bytes,
+                'evictions': self.evictions}
+
+
+class SQLiteBackend:
+    # one cache file shared by every worker process on the machine
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("""CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY,
+            category_id INTEGER,
+            headers TEXT NOT NULL,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            accessed REAL NOT NULL
+        )""")
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_response_cache_category_id ON response_cache (category_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_response_cache_accessed ON response_cache (accessed)')
+        # running total of the body sizes, kept by triggers so every process
+        # sees it without summing the table on each write
+        conn.execute('CREATE TABLE IF NOT EXISTS response_cache_size '
+                     '(id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)')
+        conn.execute('INSERT OR IGNORE INTO response_cache_size SELECT 0, total(size) FROM response_cache')
+        for name, event, change in (
+            ('insert', 'INSERT', '+ NEW.size'),
+            ('update', 'UPDATE OF size', '+ NEW.size - OLD.size'),
+            ('delete', 'DELETE', '- OLD.size'),
+        ):
+            conn.execute(f'CREATE TRIGGER IF NOT EXISTS response_cache_size_{name} AFTER {event} ON response_cache '
+                         f'BEGIN UPDATE response_cache_size SET total = total {change}; END')
+
+    def _connect(self):
+        # one connection per thread and process, never shared across a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute('SELECT headers, body, accessed FROM response_cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        # recency only needs second precision, which keeps most hits read-only
+        if now - row[2] > 1:
+            conn.execute('UPDATE response_cache SET accessed = ? WHERE key = ?', (now, key))
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, category_id, headers, body):
+        conn = self._connect()
+        # an upsert rather than INSERT OR REPLACE, whose implicit delete would
+        # skip the size triggers
+        conn.execute(
+            'INSERT INTO response_cache (key, category_id, headers, body, size, accessed) '
+            'VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET category_id = excluded.category_id, headers = excluded.headers, '
+            'body = excluded.body, size = excluded.size, accessed = excluded.accessed',
+            (key, category_id, json.dumps(headers), body, len(body), time.time())
+        )
+        total = conn.execute('SELECT total FROM response_cache_size').fetchone()[0]
+        while total > self.max_bytes:
+            oldest = conn.execute('SELECT key, size FROM response_cache ORDER BY accessed LIMIT 1').fetchone()
+            if oldest is None:
+                break
+            conn.execute('DELETE FROM response_cache WHERE key = ?', (oldest[0],))
+            total -= oldest[1]
+            self.evictions += 1
+
+    def invalidate(self, category_id):
+        self._connect().execute('DELETE FROM response_cache WHERE category_id = ?', (category_id,))
+
+    def clear(self):
+        self._connect().execute('DELETE FROM response_cache')
+
+    def stats(self):
+        conn = self._connect()
+        entries = conn.execute('SELECT count(*) FROM response_cache').fetchone()[0]
+        size = conn.execute('SELECT total FROM response_cache_size').fetchone()[0]
+        return {'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes,
+                'evictions': self.evictions, 'path': self.path}
+
+
+backend = None
+hits = 0
+misses = 0
+
+# keeps apps bound to different databases (tests, benchmarks) apart in a shared backend
+_namespace = ''
+
+
+def init_app(app):
+    global backend, hits, misses, _namespace
+    kind = app.config['RESPONSE_CACHE']
+    max_bytes = app.config['RESPONSE_CACHE_MAX_BYTES']
+    if not kind:
+        backend = None
+    elif kind == 'memory':
+        backend = MemoryBackend(max_bytes)
+    elif kind == 'sqlite':
+        path = app.config['RESPONSE_CACHE_PATH'] or os.path.join(app.instance_path, 'response_cache.sqlite')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        backend = SQLiteBackend(path, max_bytes)
+    else:
+        raise ValueError(f'unknown RESPONSE_CACHE backend {kind!r}')
+    hits = misses = 0
+    _namespace = hashlib.sha1(app.config['SQLALCHEMY_DATABASE_URI'].encode('utf-8')).hexdigest()[:8]
+
+
+def get(key):
+    # cached (headers, body) of a response, or None
+    global hits, misses
+    if backend is None:
+        return None
+    try:
+        entry = backend.get(f'{_namespace}:{key}')
+    except sqlite3.Error:
+        logger.warning('response cache read failed', exc_info=True)
+        entry = None
+    if entry is None:
+        misses += 1
+    else:
+        hits += 1
+    return entry
+
+
+def store(key, category_id, data, headers):
+    # encodes data once (unless it already is a response) and returns the
+    # response to send; the cached body is the exact byte string a miss produces
+    if isinstance(data, Response):
+        response = data
+        response.headers.update(headers)
+    else:
+        response = output_json(data, 200, headers)
+        response.mimetype = 'application/json'
+    if backend is not None:
+        body = response.get_data()
+        cached_headers = {name: value for name, value in response.headers.items()
+                          if name not in ('Content-Type', 'Content-Length')}
+        if len(body) <= backend.max_bytes:
+            try:
+                backend.set(f'{_namespace}:{key}', category_id, cached_headers, body)
+            except sqlite3.Error:
+                logger.warning('response cache write failed', exc_info=True)
+    return response
+
+
+def response(entry, headers):
+    cached_headers, body = entry
+    return current_app.response_class(body, 200, {**cached_headers, **headers}, mimetype='application/json')
+
+
+def invalidate(category_id):
+    # call on any write to the category; entries of older versions would never be served again anyway
+    if backend is not None:
+        try:
+            backend.invalidate(category_id)
+        except sqlite3.Error:
+            logger.warning('response cache invalidation failed', exc_info=True)
+
+
+def stats():
+    lookups = hits + misses
+    result = {
+        'backend': current_app.config['RESPONSE_CACHE'] or None,
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 4) if lookups else None
+    }
+    if backend is not None:
+        result.update(backend.stats())
+    return result
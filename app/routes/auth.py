@@ -1,22 +1,23 @@
-from flask import Blueprint, request, jsonify
-from flask_bcrypt import Bcrypt
+from flask import current_app, request
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import create_access_token
 from app.models import User
 from app import db
+from app import passwords, throttling
 
 #namespace for Auth-related operations
 auth_ns = Namespace('auth', description='Authentication related operations')
 
-# bcrypt instance for password hashing
-bcrypt = Bcrypt()
-
 # user model for validation via Flask-RESTX
 user_model = auth_ns.model('User_auth', {
     'email': fields.String(required=True, description='User email'),
     'password': fields.String(required=True, description='User password')
 })
 
+def hashing_busy():
+    retry_after = current_app.config['PASSWORD_HASH_RETRY_AFTER']
+    return {'error': 'server busy, try again later'}, 503, {'Retry-After': str(retry_after)}
+
 @auth_ns.route('/register')
 class Register(Resource):
     @auth_ns.expect(user_model)
@@ -33,7 +34,10 @@ class Register(Resource):
             return {"error": "email already taken"}, 409
 
         # hash the password
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        try:
+            hashed_password = passwords.generate_password_hash(password)
+        except passwords.HashingBusy:
+            return hashing_busy()
 
         # create new user and save to DB
         new_user = User(email=email, password=hashed_password)
@@ -51,11 +55,23 @@ class Login(Resource):
         email = data.get('email')
         password = data.get('password')
 
+        # refuse throttled logins before spending any hashing time on them
+        wait = throttling.retry_after(email, request.remote_addr)
+        if wait:
+            return {'error': 'too many failed logins, try again later'}, 429, {'Retry-After': str(wait)}
+
         # find user in DB
         user = User.query.filter_by(email=email).first()
-        if user and bcrypt.check_password_hash(user.password, password):
+        try:
+            valid = user is not None and passwords.check_password_hash(user.password, password)
+        except passwords.HashingBusy:
+            return hashing_busy()
+
+        if valid:
+            throttling.record_success(email)
             # generate JWT token on successful login
             access_token = create_access_token(identity=str(user.id))
             return {'access_token': access_token}, 200
         else:
+            throttling.record_failure(email, request.remote_addr)
             return {'error': 'invalid email or password'}, 401
\ No newline at end of file
@@ -1,7 +1,15 @@
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
 from app.models import Category, CategoryAttribute
 from app import db
+from app import jobs
+from app import repository
+from app import response_cache
+from app import serialization
+from app import versioning
+from app.pagination import pagination_args, paginate, page_headers
 
 categories_ns = Namespace('categories', description='categories related operations')
 
@@ -26,15 +34,27 @@ category_with_attributes_input = categories_ns.model('CategoryWithAttributesInpu
     'attributes': fields.List(fields.Nested(attribute_input), required=True)
 })
 
+def category_list_etag(resource):
+    user_id = get_jwt_identity()
+    return versioning.make_etag('categories', user_id, versioning.category_list_stamp(user_id))
+
+def category_etag(resource, category_id):
+    user_id = get_jwt_identity()
+    version = versioning.category_version(category_id, user_id)
+    return versioning.make_etag('category', user_id, category_id, version) if version else None
+
 @categories_ns.route('')
 class CategoryListResource(Resource):
 
-    @categories_ns.marshal_list_with(category_model)
+    @versioning.conditional(category_list_etag)
+    @categories_ns.expect(pagination_args)
+    @serialization.list_response(category_model)
     @jwt_required()
     def get(self):
         user_id = get_jwt_identity()
-        categories = Category.query.filter_by(owner_id=user_id).all()
-        return categories
+        args = pagination_args.parse_args()
+        categories, next_cursor = paginate(repository.category_rows_query(user_id), Category.id, args)
+        return categories, 200, page_headers(next_cursor)
     
     @categories_ns.expect(category_with_attributes_input)
     @categories_ns.marshal_with(category_model, code=201)
@@ -53,7 +73,12 @@ class CategoryListResource(Resource):
         # create category
         new_category = Category(name=name, owner_id=user_id)
         db.session.add(new_category)
-        db.session.flush()  # get ID before commit
+        try:
+            db.session.flush()  # get ID before commit
+        except IntegrityError:
+            # a concurrent request created the same category first
+            db.session.rollback()
+            categories_ns.abort(400, 'category with this name already exists.')
 
         # add attributes
         for attr in attributes:
@@ -68,10 +93,11 @@ class CategoryListResource(Resource):
 
 @categories_ns.route('/<int:category_id>')
 class CategoryResource(Resource):
+    @versioning.conditional(category_etag)
     @jwt_required()
     def get(self, category_id):
         user_id = get_jwt_identity()
-        category = Category.query.filter_by(id=category_id, owner_id=user_id).first()
+        category = repository.category_rows_query(user_id).filter(Category.id == category_id).first()
         if not category:
             return {'error': 'category not found'}, 404
 
@@ -79,10 +105,29 @@ class CategoryResource(Resource):
             'id': attr.id, 
             'name': attr.name, 
             'attribute_type': attr.attribute_type
-        } for attr in category.attributes]
+        } for attr in repository.attribute_rows(category_id)]
 
         return {
             'id': category.id,
             'name': category.name,
             'attributes': attributes
-        }
\ No newline at end of file
+        }
+
+    @categories_ns.doc(description='Delete a category with all of its attributes, items and their values')
+    @jwt_required()
+    def delete(self, category_id):
+        user_id = int(get_jwt_identity())
+
+        # one statement, the database removes attributes, items, values and
+        # feed activity through ON DELETE CASCADE
+        result = db.session.execute(
+            delete(Category).where(Category.id == category_id, Category.owner_id == user_id)
+        )
+        if not result.rowcount:
+            db.session.rollback()
+            return {'error': 'category not found or unauthorized'}, 404
+        db.session.commit()
+
+        response_cache.invalidate(category_id)
+        jobs.forget_category(category_id)
+        return {'message': 'category deleted successfully'}, 200
@@ -1,6 +1,6 @@
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import User
+from app import authz, response_cache
 
 dashboard_ns = Namespace('dashboard', description='Dashboard related operations')
 
@@ -16,7 +16,14 @@ class CurrentUserResource(Resource):
     @jwt_required()
     def get(self):
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = authz.get_user(user_id)
         if not user:
             dashboard_ns.abort(404, 'user not found')
-        return user
\ No newline at end of file
+        return user._asdict()
+
+@dashboard_ns.route('/cache')
+class CacheStatsResource(Resource):
+    @dashboard_ns.doc(description='Hit/miss counters of the authorization and response caches of this worker')
+    @jwt_required()
+    def get(self):
+        return {**authz.stats(), 'responses': response_cache.stats()}, 200
@@ -1,50 +1,74 @@
-from flask_restx import Namespace, Resource, fields
+from flask import Response, stream_with_context
+from flask_restx import Namespace, Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Category, CategoryAttribute, Follow, Item
-from app import db
+from app.models import Category, Item
+from app import authz
+from app import exporting
+from app import repository
+from app import serialization
+from app import versioning
+from app.authz import is_following
+from app.pagination import pagination_args, paginate, page_headers
 
 explore_ns = Namespace('explore', description='explore related operations')
 
-def is_following(current_user_id, target_user_id):
-    return Follow.query.filter_by(follower_id=current_user_id, followed_id=target_user_id).first() is not None
-
 @explore_ns.route('/<int:user_id>/categories')
 class ExploreCategoriesResource(Resource):
+    @explore_ns.expect(pagination_args)
+    @serialization.list_response()
     @jwt_required()
     def get(self, user_id):
         current_user_id = get_jwt_identity()
+        args = pagination_args.parse_args()
 
         if not is_following(current_user_id, user_id):
             return {'error': 'you are not following this user'}, 403
 
-        categories = Category.query.filter_by(owner_id=user_id).all()
-        return [{'id': cat.id, 'name': cat.name} for cat in categories], 200
+        categories, next_cursor = paginate(repository.category_rows_query(user_id), Category.id, args)
+        return [{'id': cat.id, 'name': cat.name} for cat in categories], 200, page_headers(next_cursor)
+
+def explore_items_etag(resource, user_id, category_id):
+    # shared by all followers; non-followers fall through to the 403 below
+    if not is_following(get_jwt_identity(), user_id):
+        return None
+    version = versioning.category_version(category_id, user_id)
+    return versioning.make_etag('explore', user_id, category_id, version) if version else None
 
 @explore_ns.route('/<int:user_id>/items/<int:category_id>')
 class ExploreItemsResource(Resource):
+    @versioning.conditional(explore_items_etag, cache=True)
+    @explore_ns.expect(pagination_args)
+    @serialization.list_response()
     @jwt_required()
     def get(self, user_id, category_id):
         current_user_id = get_jwt_identity()
+        args = pagination_args.parse_args()
+
+        if not is_following(current_user_id, user_id):
+            return {'error': 'you are not following this user'}, 403
+
+        items, next_cursor = paginate(repository.item_rows_query(user_id, category_id), Item.id, args)
+        names = repository.attribute_names(category_id)
+        result = repository.serialize_rows(items, names, with_field_id=False)
+
+        return result, 200, page_headers(next_cursor)
+
+@explore_ns.route('/<int:user_id>/collection')
+class ExploreCollectionResource(Resource):
+    @explore_ns.doc(description='All categories, attributes and items of a followed user as one streamed JSON document')
+    @jwt_required()
+    def get(self, user_id):
+        current_user_id = get_jwt_identity()
 
         if not is_following(current_user_id, user_id):
             return {'error': 'you are not following this user'}, 403
 
-        items = Item.query.filter_by(owner_id=user_id, category_id=category_id).all()
-        result = []
-
-        for item in items:
-            attribute_values = []
-            for val in item.values:
-                attr = CategoryAttribute.query.get(val.field_id)
-                attribute_values.append({
-                    'attribute_name': attr.name if attr else None,
-                    'value': val.value
-                })
-
-            result.append({
-                'id': item.id,
-                'category_id': item.category_id,
-                'values': attribute_values
-            })
-
-        return result, 200
+        owner = authz.get_user(user_id)
+        if not owner:
+            return {'error': 'user not found'}, 404
+
+        # categories and attributes up front, item values streamed in one ordered query
+        categories, attributes = repository.collection(user_id)
+        rows = repository.collection_values(user_id)
+        body = exporting.iter_collection_json(owner._asdict(), categories, attributes, rows)
+        return Response(stream_with_context(body), mimetype='application/json')
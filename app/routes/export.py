@@ -1,44 +1,109 @@
-from flask_restx import Namespace, Resource
+from flask_restx import Namespace, Resource, reqparse
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Category, CategoryAttribute, Follow, Item
-from app import db
-from flask import make_response, render_template
-from xhtml2pdf import pisa
-import io
+from app.models import Category, Item
+from app import exporting
+from app import jobs
+from app import repository
+from flask import Response, send_file, stream_with_context
+import os
 
 export_ns = Namespace('export', description='export related operations')
 
-def get_attr_name(field_id):
-    attr = CategoryAttribute.query.get(field_id)
-    return attr.name if attr else 'Unknown'
+export_args = reqparse.RequestParser()
+export_args.add_argument('format', choices=tuple(exporting.FORMATS), default='pdf', location='args',
+                         help='export format')
 
 @export_ns.route('/<int:category_id>')
 class ExportResource(Resource):
-    @export_ns.doc(description='Export items from a category as a PDF')
+    @export_ns.doc(description='Export items from a category as a PDF, CSV or NDJSON stream')
+    @export_ns.expect(export_args)
     @jwt_required()
     def get(self, category_id):
         user_id = get_jwt_identity()
-        category = Category.query.get(category_id)
-        items = Item.query.filter_by(owner_id=user_id, category_id=category_id).all()
+        export_format = export_args.parse_args()['format']
 
-        if not items:
+        category = Category.query.filter_by(id=category_id, owner_id=user_id).first()
+        if not category or not Item.query.filter_by(owner_id=user_id, category_id=category_id).first():
             return {'message': 'no items found'}, 404
 
-        rendered = render_template(
-            'export.html',
-            items=items,
-            category_id=category_id,
-            name = category.name,
-            get_attr_name=get_attr_name
-        )
+        # attribute names are resolved once instead of per value in the template
+        names = repository.attribute_names(category_id)
+
+        if export_format == 'csv':
+            body = exporting.iter_csv(user_id, category_id, names)
+        elif export_format == 'ndjson':
+            body = exporting.iter_ndjson(user_id, category_id, names)
+        else:
+            pdf = exporting.render_pdf(user_id, category, names)
+            if pdf is None:
+                return {'message': 'PDF generation failed'}, 500
+            body = exporting.iter_file(pdf)
+
+        response = Response(stream_with_context(body), mimetype=exporting.FORMATS[export_format])
+        response.headers['Content-Disposition'] = f'attachment; filename={category.name}_items.{export_format}'
+        return response
+
+
+@export_ns.route('/jobs/<int:category_id>')
+class ExportJobCreateResource(Resource):
+    @export_ns.doc(description='Queue an export of a category, rendered in a background worker')
+    @export_ns.expect(export_args)
+    @jwt_required()
+    def post(self, category_id):
+        user_id = int(get_jwt_identity())
+        export_format = export_args.parse_args()['format']
+
+        category = Category.query.filter_by(id=category_id, owner_id=user_id).first()
+        if not category or not Item.query.filter_by(owner_id=user_id, category_id=category_id).first():
+            return {'message': 'no items found'}, 404
+
+        status = jobs.submit_export(user_id, category_id, export_format)
+        return job_response(status), 200 if status['state'] == 'done' else 202
 
-        pdf_buffer = io.BytesIO()
-        pisa_status = pisa.CreatePDF(rendered, dest=pdf_buffer)
 
-        if pisa_status.err:
-            return {'message': 'PDF generation failed'}, 500
+@export_ns.route('/jobs/status/<string:job_id>')
+class ExportJobStatusResource(Resource):
+    @export_ns.doc(description='Show the progress of an export job')
+    @jwt_required()
+    def get(self, job_id):
+        status = jobs.read_status(jobs.export_dir(), job_id)
+        if not status or status['owner_id'] != int(get_jwt_identity()):
+            return {'error': 'export job not found'}, 404
+        return job_response(status), 200
+
+
+@export_ns.route('/jobs/download/<string:job_id>')
+class ExportJobDownloadResource(Resource):
+    @export_ns.doc(description='Download the file of a finished export job')
+    @jwt_required()
+    def get(self, job_id):
+        directory = jobs.export_dir()
+        status = jobs.read_status(directory, job_id)
+        if not status or status['owner_id'] != int(get_jwt_identity()):
+            return {'error': 'export job not found'}, 404
+
+        path = jobs.artifact_path(directory, job_id, status['format'])
+        if status['state'] != 'done' or not os.path.exists(path):
+            return {'error': 'export is not ready', 'state': status['state']}, 409
+
+        category = Category.query.get(status['category_id'])
+        if category is None:
+            # deleted since the job finished
+            return {'error': 'export job not found'}, 404
+        return send_file(
+            path,
+            mimetype=exporting.FORMATS[status['format']],
+            as_attachment=True,
+            download_name=f"{category.name}_items.{status['format']}"
+        )
+
 
-        response = make_response(pdf_buffer.getvalue())
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename={category.name}_items.pdf'
-        return response
\ No newline at end of file
+def job_response(status):
+    return {
+        'id': status['id'],
+        'category_id': status['category_id'],
+        'format': status['format'],
+        'state': status['state'],
+        'progress': {'done': status['done'], 'total': status['total']},
+        'error': status['error']
+    }
@@ -0,0 +1,46 @@
+from flask_restx import Namespace, Resource, fields
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app import feed
+from app import serialization
+from app.pagination import pagination_args, encode_cursor, page_headers
+
+feed_ns = Namespace('feed', description='activity feed of followed users')
+
+feed_value_model = feed_ns.model('FeedValue', {
+    'attribute_name': fields.String,
+    'value': fields.String,
+    'field_id': fields.Integer
+})
+
+feed_item_model = feed_ns.model('FeedItem', {
+    'id': fields.Integer,
+    'category_id': fields.Integer,
+    'values': fields.List(fields.Nested(feed_value_model))
+})
+
+feed_owner_model = feed_ns.model('FeedOwner', {
+    'id': fields.Integer,
+    'email': fields.String
+})
+
+feed_entry_model = feed_ns.model('FeedEntry', {
+    'id': fields.Integer(description='Activity ID'),
+    'verb': fields.String(enum=['created', 'updated']),
+    'created_at': fields.DateTime,
+    'owner': fields.Nested(feed_owner_model),
+    'item': fields.Nested(feed_item_model)
+})
+
+@feed_ns.route('')
+class FeedResource(Resource):
+    @feed_ns.doc(description='Newest item creations and updates of followed users, newest first')
+    @feed_ns.expect(pagination_args)
+    @serialization.list_response(feed_entry_model)
+    @jwt_required()
+    def get(self):
+        user_id = int(get_jwt_identity())
+        args = pagination_args.parse_args()
+
+        entries, last_id = feed.page(user_id, args['limit'], args['cursor'])
+        next_cursor = encode_cursor(last_id) if last_id is not None else None
+        return entries, 200, page_headers(next_cursor)
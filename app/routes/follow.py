@@ -1,7 +1,11 @@
-from flask_restx import Namespace, Resource, fields
+from flask_restx import Namespace, Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Category, CategoryAttribute, Follow, User
+from sqlalchemy.exc import IntegrityError
+from app.models import Follow
 from app import db
+from app import authz
+from app import feed
+from app.pagination import pagination_args, paginate, page_headers
 
 follow_ns = Namespace('follow', description='follow related operations')
 
@@ -10,14 +14,14 @@ class FollowUserResource(Resource):
     @follow_ns.doc(description="Follow another user by their email")
     @jwt_required()
     def post(self, email):
-        follower_id = get_jwt_identity()
+        follower_id = int(get_jwt_identity())
         email = email
 
         if not email:
             return {'error': 'Email is required'}, 400
 
         # find the user to follow
-        user_to_follow = User.query.filter_by(email=email).first()
+        user_to_follow = authz.get_user_by_email(email)
         if not user_to_follow:
             return {'error': 'user with this email does not exist'}, 404
 
@@ -25,31 +29,35 @@ class FollowUserResource(Resource):
             return {'error': 'you cannot follow yourself'}, 400
 
         # check if already following
-        existing_follow = Follow.query.filter_by(
-            follower_id=follower_id,
-            followed_id=user_to_follow.id
-        ).first()
-        if existing_follow:
+        if authz.is_following(follower_id, user_to_follow.id):
             return {'message': 'already following this user'}, 200
 
         # create follow relationship
         follow = Follow(follower_id=follower_id, followed_id=user_to_follow.id)
         db.session.add(follow)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # a concurrent request created the same follow first
+            db.session.rollback()
+            return {'message': 'already following this user'}, 200
+        finally:
+            authz.follow_changed(follower_id, user_to_follow.id)
 
+        feed.follow_added(follower_id, user_to_follow.id)
         return {'message': f'now following {email}'}, 201
 
 @follow_ns.route('/')
 class FollowListResource(Resource):
     @follow_ns.doc(description="Show all followed users")
+    @follow_ns.expect(pagination_args)
     @jwt_required()
     def get(self):
         user_id = get_jwt_identity()
-        followed = Follow.query.filter_by(follower_id=user_id).all()
+        args = pagination_args.parse_args()
+
+        # page over follow edges, then load the followed users of that page
+        followed, next_cursor = paginate(Follow.query.filter_by(follower_id=user_id), Follow.id, args)
         followed_ids = [f.followed_id for f in followed]
-        followed_users = User.query.filter(User.id.in_(followed_ids)).all()
-        result = [
-            {'id': user.id, 'email': user.email}
-            for user in followed_users if user
-        ]
-        return {'followed users': result}, 200
\ No newline at end of file
+        result = [{'id': user.id, 'email': user.email} for user in authz.get_users(followed_ids)]
+        return {'followed users': result, 'next_cursor': next_cursor}, 200, page_headers(next_cursor)
\ No newline at end of file
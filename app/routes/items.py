@@ -1,7 +1,19 @@
-from flask_restx import Namespace, Resource, fields
+from flask import request
+from flask_restx import Namespace, Resource, fields, reqparse
+from werkzeug.datastructures import FileStorage
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import User, Item, Category, CategoryAttribute, ItemAttributeValue
+from sqlalchemy import delete
+from app.models import Item, Category, CategoryAttribute, ItemAttributeValue
 from app import db
+from app import serialization
+from app import feed
+from app import importing
+from app import querying
+from app import repository
+from app import search
+from app import versioning
+from app.attribute_types import typed_columns
+from app.pagination import pagination_args, paginate, page_headers, page_limit, DEFAULT_LIMIT
 
 items_ns = Namespace('items', description='item related operations')
 
@@ -27,6 +39,52 @@ item_create_input = items_ns.model('ItemCreateInput', {
     'values': fields.List(fields.Nested(item_value_input), required=True)
 })
 
+# largest number of operations accepted by one bulk request
+MAX_BULK_ITEMS = 5000
+
+item_bulk_operation = items_ns.model('ItemBulkOperation', {
+    'action': fields.String(required=True, enum=['create', 'update', 'delete'], description='Operation to apply'),
+    'id': fields.Integer(description='Item ID, required for update and delete'),
+    'values': fields.List(fields.Nested(item_value_input), description='Values for create and update')
+})
+
+item_bulk_input = items_ns.model('ItemBulkInput', {
+    'category_id': fields.Integer(required=True, description='Category ID shared by all items'),
+    'items': fields.List(fields.Nested(item_bulk_operation), required=True)
+})
+
+item_query_filter = items_ns.model('ItemQueryFilter', {
+    'field_id': fields.Integer(required=True, description='Attribute ID to filter on'),
+    'op': fields.String(required=True, enum=sorted(querying.OPS), description='Comparison operator'),
+    'value': fields.String(description='Operand of eq, lt, lte, gt, gte, prefix and contains'),
+    'min': fields.String(description='Lower bound of between'),
+    'max': fields.String(description='Upper bound of between')
+})
+
+item_query_sort = items_ns.model('ItemQuerySort', {
+    'field_id': fields.Integer(required=True, description='Attribute ID to sort by'),
+    'direction': fields.String(enum=['asc', 'desc'], default='asc')
+})
+
+item_query_input = items_ns.model('ItemQueryInput', {
+    'filters': fields.List(fields.Nested(item_query_filter), description='All filters must match'),
+    'sort': fields.Nested(item_query_sort, allow_null=True),
+    'fields': fields.List(fields.Integer, description='Attribute IDs to return, all when omitted'),
+    'limit': fields.Integer(description='Page size'),
+    'cursor': fields.String(description='Cursor from a previous page')
+})
+
+item_query_result = items_ns.model('ItemQueryResult', {
+    'items': fields.List(fields.Nested(item_model)),
+    'next_cursor': fields.String
+})
+
+import_args = reqparse.RequestParser()
+import_args.add_argument('format', choices=('csv', 'ndjson'), location='args',
+                         help='upload format, guessed from the file name when omitted')
+import_args.add_argument('file', type=FileStorage, location='files',
+                         help='CSV or NDJSON file; the raw request body is read when omitted')
+
 @items_ns.route('/details/<int:item_id>')
 class ItemDetailResource(Resource):
     @items_ns.marshal_with(item_model)
@@ -34,25 +92,13 @@ class ItemDetailResource(Resource):
     def get(self, item_id):
         user_id = int(get_jwt_identity())
 
-        item = Item.query.filter_by(id=item_id, owner_id=user_id).first()
+        item = repository.item_row(item_id, user_id)
 
         if not item:
             return {'error': 'item not found'}, 404
 
-        attribute_values = []
-        for val in item.values:
-            attribute = CategoryAttribute.query.get(val.field_id)
-            attribute_values.append({
-                'attribute_name': attribute.name if attribute else None,
-                'value': val.value,
-                'field_id': val.field_id
-            })
-
-        return {
-            'id': item.id,
-            'category_id': item.category_id,
-            'values': attribute_values
-        }
+        names = repository.attribute_names(item.category_id)
+        return repository.serialize_rows([item], names)[0]
     
     @jwt_required()
     def delete(self, item_id):
@@ -62,6 +108,8 @@ class ItemDetailResource(Resource):
         if not item:
             return {'error': 'item not found or unauthorized'}, 404
 
+        # values and feed activity go with ON DELETE CASCADE
+        versioning.bump(item.category_id)
         db.session.delete(item)
         db.session.commit()
         return {'message': 'item deleted successfully'}, 200
@@ -97,43 +145,39 @@ class ItemDetailResource(Resource):
             item_value = ItemAttributeValue(
                 item_id=item.id,
                 field_id=field_id,
-                value=value
+                value=value,
+                **typed_columns(attribute.attribute_type, value)
             )
             db.session.add(item_value)
 
+        search.reindex([item.id])
+        feed.record(user_id, category_id, [item.id], 'updated')
+        versioning.bump(category_id)
         db.session.commit()
         return {'message': 'item updated successfully'}, 200
     
+def item_list_etag(resource, category_id):
+    user_id = get_jwt_identity()
+    version = versioning.category_version(category_id, user_id)
+    return versioning.make_etag('items', user_id, category_id, version) if version else None
+
 @items_ns.route('/all/<int:category_id>')
 class ItemListResource(Resource):
-    @items_ns.marshal_list_with(item_model)
+    @versioning.conditional(item_list_etag, cache=True)
+    @items_ns.expect(pagination_args)
+    @serialization.list_response(item_model)
     @jwt_required()
     def get(self, category_id):
         user_id = get_jwt_identity()
+        args = pagination_args.parse_args()
 
-        # fetch items owned by user and belonging to the given category
-        items = Item.query.filter_by(owner_id=user_id, category_id=category_id).all()
-
-        result = []
-        for item in items:
-            # only fetch the first attribute value (if it exists)
-            first_value = item.values[0] if item.values else None
+        # fetch one page of items owned by user and belonging to the given category
+        items, next_cursor = paginate(repository.item_rows_query(user_id, category_id), Item.id, args)
+        names = repository.attribute_names(category_id)
 
-            attribute_data = []
-            if first_value:
-                attribute = CategoryAttribute.query.get(first_value.field_id)
-                attribute_data.append({
-                    'attribute_name': attribute.name if attribute else None,
-                    'value': first_value.value
-                })
-
-            result.append({
-                'id': item.id,
-                'category_id': item.category_id,
-                'values': attribute_data
-            })
-
-        return result
+        # only return the first attribute value (if it exists)
+        result = repository.serialize_rows(items, names, first_only=True)
+        return result, 200, page_headers(next_cursor)
 
 
 @items_ns.route('')
@@ -171,9 +215,165 @@ class ItemListResource(Resource):
             item_value = ItemAttributeValue(
                 item_id=new_item.id,
                 field_id=field_id,
-                value=value
+                value=value,
+                **typed_columns(attribute.attribute_type, value)
             )
             db.session.add(item_value)
 
+        search.reindex([new_item.id])
+        feed.record(int(user_id), category_id, [new_item.id], 'created')
+        versioning.bump(category_id)
         db.session.commit()
-        return {'message': 'item created successfully'}, 201
\ No newline at end of file
+        return {'message': 'item created successfully'}, 201
+
+@items_ns.route('/bulk')
+class ItemBulkResource(Resource):
+    @items_ns.expect(item_bulk_input)
+    @items_ns.doc(description='Create, update and delete many items of one category in a single transaction')
+    @jwt_required()
+    def post(self):
+        user_id = int(get_jwt_identity())
+        data = items_ns.payload
+
+        category_id = data.get('category_id')
+        operations = data.get('items', [])
+
+        if len(operations) > MAX_BULK_ITEMS:
+            return {'error': f'at most {MAX_BULK_ITEMS} items per request'}, 413
+
+        category = Category.query.filter_by(id=category_id, owner_id=user_id).first()
+        if not category:
+            return {'error': 'invalid category or access denied'}, 403
+
+        # everything needed for validation is loaded up front in two queries
+        field_types = dict(db.session.query(CategoryAttribute.id, CategoryAttribute.attribute_type).filter_by(category_id=category_id))
+        requested_ids = {op['id'] for op in operations if op.get('id') is not None}
+        owned_ids = set()
+        if requested_ids:
+            owned_ids = {item_id for (item_id,) in db.session.query(Item.id).filter(
+                Item.id.in_(requested_ids), Item.owner_id == user_id, Item.category_id == category_id)}
+
+        results = []
+        creates, updates, deletes = [], [], []
+        seen_ids = set()
+        for index, op in enumerate(operations):
+            error = validate_bulk_operation(op, field_types, owned_ids, seen_ids)
+            results.append({'index': index, 'action': op['action'], 'id': op.get('id'), 'status': 'error' if error else 'ok', 'error': error})
+            if error:
+                continue
+            if op['action'] == 'create':
+                creates.append(index)
+            elif op['action'] == 'update':
+                updates.append(index)
+            else:
+                deletes.append(index)
+
+        # replaced items lose all of their current values, deleted ones take
+        # their values and feed activity along with ON DELETE CASCADE
+        updated_ids = [operations[i]['id'] for i in updates]
+        if updated_ids:
+            db.session.execute(delete(ItemAttributeValue).where(ItemAttributeValue.item_id.in_(updated_ids)))
+        if deletes:
+            deleted_ids = [operations[i]['id'] for i in deletes]
+            db.session.execute(delete(Item).where(Item.id.in_(deleted_ids)))
+
+        if creates:
+            new_ids = repository.insert_items(user_id, category_id, len(creates))
+            for index, new_id in zip(creates, new_ids):
+                results[index]['id'] = new_id
+
+        repository.insert_values([
+            repository.value_row(results[index]['id'], val['field_id'], val['value'], field_types[val['field_id']])
+            for index in creates + updates
+            for val in operations[index].get('values') or []
+        ])
+
+        search.reindex(results[index]['id'] for index in creates + updates)
+        feed.record(user_id, category_id, [results[index]['id'] for index in creates], 'created')
+        feed.record(user_id, category_id, [operations[index]['id'] for index in updates], 'updated')
+        if creates or updates or deletes:
+            versioning.bump(category_id)
+        db.session.commit()
+
+        status_names = {'create': 'created', 'update': 'updated', 'delete': 'deleted'}
+        for result in results:
+            if result['status'] == 'ok':
+                result['status'] = status_names[result['action']]
+
+        return {
+            'results': results,
+            'succeeded': len(creates) + len(updates) + len(deletes),
+            'failed': len(operations) - len(creates) - len(updates) - len(deletes)
+        }, 200
+
+
+def validate_bulk_operation(op, field_types, owned_ids, seen_ids):
+    if op['action'] != 'create':
+        if op.get('id') is None:
+            return f"item ID is required for {op['action']}"
+        if op['id'] not in owned_ids:
+            return 'item not found or unauthorized'
+        if op['id'] in seen_ids:
+            return 'item appears more than once in this request'
+        seen_ids.add(op['id'])
+
+    if op['action'] != 'delete':
+        for val in op.get('values') or []:
+            if val['field_id'] not in field_types:
+                return f"attribute ID {val['field_id']} does not belong to this category"
+    return None
+
+
+@items_ns.route('/import/<int:category_id>')
+class ItemImportResource(Resource):
+    @items_ns.expect(import_args)
+    @items_ns.doc(description='Import items into a category from a CSV or NDJSON upload')
+    @jwt_required()
+    def post(self, category_id):
+        user_id = int(get_jwt_identity())
+        args = import_args.parse_args()
+
+        category = Category.query.filter_by(id=category_id, owner_id=user_id).first()
+        if not category:
+            return {'error': 'invalid category or access denied'}, 403
+
+        attributes = CategoryAttribute.query.filter_by(category_id=category_id).all()
+        if not attributes:
+            return {'error': 'category has no attributes'}, 400
+
+        # multipart uploads are spooled to disk by werkzeug, raw bodies are read as they arrive
+        upload = args['file']
+        stream = upload.stream if upload else request.stream
+        filename = (upload.filename or '') if upload else ''
+
+        import_format = args['format'] or ('ndjson' if filename.endswith(('.ndjson', '.jsonl')) else 'csv')
+        if import_format == 'ndjson':
+            records = importing.iter_ndjson_records(stream)
+        else:
+            records = importing.iter_csv_records(stream)
+
+        return importing.import_records(user_id, attributes, records), 200
+
+
+@items_ns.route('/query/<int:category_id>')
+class ItemQueryResource(Resource):
+    @items_ns.expect(item_query_input)
+    @items_ns.doc(description='Filter, sort and project the items of a category in the database')
+    @items_ns.response(200, 'Success', item_query_result)
+    @jwt_required()
+    def post(self, category_id):
+        user_id = int(get_jwt_identity())
+        spec = items_ns.payload or {}
+
+        category = Category.query.filter_by(id=category_id, owner_id=user_id).first()
+        if not category:
+            return {'error': 'category not found'}, 404
+
+        attributes = {attr.id: attr for attr in CategoryAttribute.query.filter_by(category_id=category_id)}
+        try:
+            limit = page_limit(spec.get('limit') or DEFAULT_LIMIT)
+            items, next_cursor = querying.run_query(user_id, category_id, attributes, spec, limit)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+        return {'items': items, 'next_cursor': next_cursor}, 200, page_headers(next_cursor)
@@ -0,0 +1,59 @@
+from flask_restx import Namespace, Resource, fields, reqparse
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app import db
+from app import search
+from app.pagination import page_limit, page_headers, DEFAULT_LIMIT
+from app.authz import is_following
+
+search_ns = Namespace('search', description='search related operations')
+
+search_args = reqparse.RequestParser()
+search_args.add_argument('q', required=True, location='args', help='text to search for in attribute values')
+search_args.add_argument('user_id', type=int, location='args',
+                         help='only search the items of this user (yourself or someone you follow)')
+search_args.add_argument('category_id', type=int, location='args', help='only search this category')
+search_args.add_argument('limit', type=page_limit, default=DEFAULT_LIMIT, location='args', help='page size')
+search_args.add_argument('cursor', location='args', help='cursor from a previous page')
+
+search_hit_model = search_ns.model('SearchHit', {
+    'id': fields.Integer(description='Item ID'),
+    'owner_id': fields.Integer,
+    'category_id': fields.Integer,
+    'score': fields.Float(description='Relevance, higher is better'),
+    'snippet': fields.String(description='Matching text with the hit in [brackets]')
+})
+
+search_result_model = search_ns.model('SearchResult', {
+    'items': fields.List(fields.Nested(search_hit_model)),
+    'next_cursor': fields.String
+})
+
+@search_ns.route('')
+class SearchResource(Resource):
+    @search_ns.expect(search_args)
+    @search_ns.response(200, 'Success', search_result_model)
+    @search_ns.doc(description='Full-text search over your items and the items of users you follow')
+    @jwt_required()
+    def get(self):
+        user_id = int(get_jwt_identity())
+        args = search_args.parse_args()
+
+        if db.engine.dialect.name != 'sqlite':
+            return {'error': 'search requires the SQLite FTS5 index'}, 501
+
+        owner_id = args['user_id']
+        if owner_id is not None and owner_id != user_id and not is_following(user_id, owner_id):
+            return {'error': 'you are not following this user'}, 403
+
+        try:
+            hits, next_cursor = search.search(
+                args['q'], user_id,
+                owner_id=owner_id,
+                category_id=args['category_id'],
+                limit=args['limit'],
+                cursor=args['cursor']
+            )
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+        return {'items': hits, 'next_cursor': next_cursor}, 200, page_headers(next_cursor)
@@ -0,0 +1,163 @@
+import base64
+import json
+import re
+from sqlalchemy import DDL, bindparam, event, text
+from app import db
+
+# full-text index over attribute values: one FTS5 document per item holding
+# all of its values. Write paths call reindex() once per batch of items after
+# writing their values; deleted items (cascades included) are dropped by a
+# trigger. A trigger per value row would rebuild the whole document for every
+# value, O(values²) per item.
+
+FTS_TABLE = 'item_search'
+
+# SQLite refuses to rebuild item or item_attribute_value while these exist,
+# migrations doing batch table rebuilds drop and recreate them around it
+CREATE_TRIGGER_STATEMENTS = [
+    f"""CREATE TRIGGER IF NOT EXISTS item_search_item_delete
+        AFTER DELETE ON item BEGIN DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id; END""",
+]
+
+# per-value triggers of the schema before migration 5e2a9d7c4b18, only for
+# the migrations up to it
+_REINDEX = f"""
+    DELETE FROM {FTS_TABLE} WHERE rowid = {{item_id}};
+    INSERT INTO {FTS_TABLE} (rowid, owner_id, category_id, content)
+    SELECT item.id, item.owner_id, item.category_id, group_concat(item_attribute_value.value, ' ')
+    FROM item JOIN item_attribute_value ON item_attribute_value.item_id = item.id
+    WHERE item.id = {{item_id}}
+    GROUP BY item.id;
+"""
+
+VALUE_TRIGGER_STATEMENTS = [
+    f"""CREATE TRIGGER IF NOT EXISTS item_search_value_insert
+        AFTER INSERT ON item_attribute_value BEGIN {_REINDEX.format(item_id='NEW.item_id')} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS item_search_value_update
+        AFTER UPDATE OF value, item_id ON item_attribute_value BEGIN
+        {_REINDEX.format(item_id='OLD.item_id')} {_REINDEX.format(item_id='NEW.item_id')} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS item_search_value_delete
+        AFTER DELETE ON item_attribute_value
+        WHEN EXISTS (SELECT 1 FROM item WHERE item.id = OLD.item_id)
+        BEGIN {_REINDEX.format(item_id='OLD.item_id')} END""",
+]
+
+DROP_TRIGGER_STATEMENTS = [
+    'DROP TRIGGER IF EXISTS item_search_item_delete',
+    'DROP TRIGGER IF EXISTS item_search_value_delete',
+    'DROP TRIGGER IF EXISTS item_search_value_update',
+    'DROP TRIGGER IF EXISTS item_search_value_insert',
+]
+
+CREATE_STATEMENTS = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        owner_id UNINDEXED, category_id UNINDEXED, content,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+] + CREATE_TRIGGER_STATEMENTS
+
+DROP_STATEMENTS = DROP_TRIGGER_STATEMENTS + [f'DROP TABLE IF EXISTS {FTS_TABLE}']
+
+# fills the index for rows that existed before it was created
+REBUILD_STATEMENT = f"""
+    INSERT INTO {FTS_TABLE} (rowid, owner_id, category_id, content)
+    SELECT item.id, item.owner_id, item.category_id, group_concat(item_attribute_value.value, ' ')
+    FROM item JOIN item_attribute_value ON item_attribute_value.item_id = item.id
+    GROUP BY item.id
+"""
+
+_DELETE_DOCUMENTS = text(f'DELETE FROM {FTS_TABLE} WHERE rowid IN :item_ids').bindparams(
+    bindparam('item_ids', expanding=True))
+
+_INSERT_DOCUMENTS = text(f"""
+    INSERT INTO {FTS_TABLE} (rowid, owner_id, category_id, content)
+    SELECT item.id, item.owner_id, item.category_id, group_concat(item_attribute_value.value, ' ')
+    FROM item JOIN item_attribute_value ON item_attribute_value.item_id = item.id
+    WHERE item.id IN :item_ids
+    GROUP BY item.id
+""").bindparams(bindparam('item_ids', expanding=True))
+
+
+def reindex(item_ids):
+    # rebuilds the documents of these items from their current values; call in
+    # the transaction that wrote the values, after adding them to the session
+    item_ids = list(item_ids)
+    if not item_ids or db.engine.dialect.name != 'sqlite':
+        return
+    db.session.flush()
+    db.session.execute(_DELETE_DOCUMENTS, {'item_ids': item_ids})
+    db.session.execute(_INSERT_DOCUMENTS, {'item_ids': item_ids})
+
+
+# db.create_all() creates the index as well when running on SQLite
+for statement in CREATE_STATEMENTS:
+    event.listen(db.metadata, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def match_expression(query):
+    # user text becomes an AND of quoted prefix terms, so FTS syntax never leaks through
+    terms = re.findall(r'\w+', query)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def encode_cursor(score, last_id):
+    raw = json.dumps([score, last_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        return float(score), int(last_id)
+    except (ValueError, TypeError):
+        raise ValueError('invalid cursor')
+
+
+def search(query, viewer_id, owner_id=None, category_id=None, limit=50, cursor=None):
+    # ranked hits, best first, keyset paged on (score, id); without owner_id the
+    # hits cover the viewer's own items and those of every user they follow
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+
+    params = {'expression': expression, 'viewer_id': viewer_id, 'limit': limit + 1}
+    conditions = [f'{FTS_TABLE} MATCH :expression']
+    if owner_id is not None:
+        conditions.append('owner_id = :owner_id')
+        params['owner_id'] = owner_id
+    else:
+        conditions.append('owner_id IN (SELECT followed_id FROM follow WHERE follower_id = :viewer_id '
+                          'UNION ALL SELECT :viewer_id)')
+    if category_id is not None:
+        conditions.append('category_id = :category_id')
+        params['category_id'] = category_id
+    if cursor:
+        params['last_score'], params['last_id'] = decode_cursor(cursor)
+        conditions.append(f'(bm25({FTS_TABLE}) > :last_score OR (bm25({FTS_TABLE}) = :last_score AND rowid > :last_id))')
+
+    rows = db.session.execute(text(f"""
+        SELECT rowid AS id, owner_id, category_id, bm25({FTS_TABLE}) AS score,
+               snippet({FTS_TABLE}, 2, '[', ']', '...', 12) AS snippet
+        FROM {FTS_TABLE}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY score, rowid
+        LIMIT :limit
+    """), params).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].score, rows[-1].id)
+
+    hits = [
+        {
+            'id': row.id,
+            'owner_id': int(row.owner_id),
+            'category_id': int(row.category_id),
+            'score': -row.score,
+            'snippet': row.snippet
+        }
+        for row in rows
+    ]
+    return hits, next_cursor
@@ -0,0 +1,106 @@
+import hashlib
+import json
+from functools import wraps
+from flask import current_app, request
+from flask_restx import fields, marshal
+from flask_restx.utils import merge, unpack
+
+try:
+    import orjson
+except ImportError:  # optional, plain json is used without it
+    orjson = None
+
+# fast path for hot list endpoints: the restx model of an endpoint is compiled
+# once into plain closures that build the output dicts, and the result is
+# encoded with orjson when it is installed. The models keep documenting the
+# responses in Swagger; FAST_SERIALIZATION = False falls back to marshal().
+
+
+def _getter(key):
+    def get(obj):
+        if isinstance(obj, dict):
+            return obj.get(key)
+        return getattr(obj, key, None)
+    return get
+
+
+def _field_encoder(field):
+    if isinstance(field, type):
+        field = field()
+    if isinstance(field, fields.Nested):
+        encode = compile_encoder(field.model)
+        if field.allow_null:
+            return lambda value: None if value is None else encode(value)
+        return encode
+    if isinstance(field, fields.List):
+        encode_item = _field_encoder(field.container)
+        return lambda value: None if value is None else [encode_item(item) for item in value]
+    if isinstance(field, (fields.DateTime, fields.Date)):
+        # same text as marshal() produces
+        return field.format
+    return None
+
+
+def compile_encoder(model):
+    # function turning one object (ORM instance or dict) into the model's output dict
+    plan = []
+    for key, field in model.items():
+        source = getattr(field, 'attribute', None) or key
+        plan.append((key, _getter(source), _field_encoder(field)))
+
+    def encode(obj):
+        result = {}
+        for key, get, convert in plan:
+            value = get(obj)
+            result[key] = convert(value) if convert is not None and value is not None else value
+        return result
+    return encode
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=str, separators=(',', ':')).encode('utf-8')
+
+
+def list_response(model=None, description=None):
+    # drop-in for @ns.marshal_list_with(model); without a model the handler's
+    # dicts are only encoded
+    encode = compile_encoder(model) if model is not None else None
+
+    def decorator(f):
+        if model is not None:
+            f.__apidoc__ = merge(getattr(f, '__apidoc__', {}), {
+                'responses': {'200': (description, [model], {})}
+            })
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            data, code, headers = unpack(f(*args, **kwargs))
+            if code != 200:
+                return data, code, headers
+            if not current_app.config['FAST_SERIALIZATION']:
+                return (marshal(data, model) if model is not None else data), code, headers
+            body = dumps([encode(row) for row in data] if encode is not None else data)
+            return current_app.response_class(body, code, headers, mimetype='application/json')
+        return wrapper
+    return decorator
+
+
+def cache_specs(app, api):
+    # replaces the restx 'specs' view: the spec dict is still built by restx
+    # on first use, but encoded once and revalidated by ETag afterwards
+    cached = {}
+
+    def specs():
+        if not cached:
+            schema = api.__schema__
+            if 'error' in schema:
+                return current_app.response_class(dumps(schema), 500, mimetype='application/json')
+            cached['body'] = dumps(schema)
+            cached['etag'] = hashlib.sha1(cached['body']).hexdigest()
+        response = current_app.response_class(cached['body'], mimetype='application/json')
+        response.set_etag(cached['etag'])
+        return response.make_conditional(request)
+
+    app.view_functions['specs'] = specs
@@ -0,0 +1,46 @@
+import time
+from flask import current_app
+from app.caching import TTLCache
+
+# failed login counters per email and per client address. Once a key reaches
+# its limit, logins for it are refused without hashing anything until its
+# window runs out. Counters live per process. The address is
+# request.remote_addr, taken from X-Forwarded-For when TRUSTED_PROXIES is set.
+
+failures = TTLCache('login_failures')
+
+
+def init_app(app):
+    failures.maxsize = app.config['AUTHZ_CACHE_SIZE']
+    failures.clear()
+
+
+def _keys(email, address):
+    config = current_app.config
+    return [
+        (('email', email), config['LOGIN_MAX_FAILURES']),
+        (('address', address), config['LOGIN_MAX_FAILURES_PER_ADDRESS']),
+    ]
+
+
+def retry_after(email, address):
+    # seconds until a login for email from address may be tried again, 0 if allowed
+    now = time.monotonic()
+    wait = 0
+    for key, limit in _keys(email, address):
+        entry = failures.get(key)
+        if entry and entry[0] >= limit:
+            wait = max(wait, entry[1] - now)
+    return int(wait) + 1 if wait > 0 else 0
+
+
+def record_failure(email, address):
+    now = time.monotonic()
+    window = current_app.config['LOGIN_FAILURE_WINDOW']
+    for key, _ in _keys(email, address):
+        count, expires = failures.get(key) or (0, now + window)
+        failures.set(key, (count + 1, expires), ttl=max(expires - now, 0))
+
+
+def record_success(email):
+    failures.invalidate(('email', email))
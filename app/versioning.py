@@ -0,0 +1,85 @@
+import hashlib
+from functools import wraps
+from flask import Response, request
+from flask_jwt_extended import verify_jwt_in_request
+from flask_restx.utils import unpack
+from sqlalchemy import update
+from app import db
+from app import response_cache
+from app.models import Category
+
+# per-category version stamps and the conditional GET support built on them:
+# every item or attribute write bumps Category.version, and read endpoints
+# derive strong ETags from it without touching the item tables
+
+
+def bump(category_id):
+    # call in the same transaction as any item or attribute write of the category
+    db.session.execute(
+        update(Category)
+        .where(Category.id == category_id)
+        .values(version=Category.version + 1)
+    )
+    response_cache.invalidate(category_id)
+
+
+def category_version(category_id, owner_id):
+    return (
+        db.session.query(Category.version)
+        .filter_by(id=category_id, owner_id=owner_id)
+        .scalar()
+    )
+
+
+def category_list_stamp(owner_id):
+    # ids and names of all of the user's categories, read from the category table only
+    rows = (
+        db.session.query(Category.id, Category.name)
+        .filter(Category.owner_id == owner_id)
+        .order_by(Category.id)
+        .all()
+    )
+    return ','.join(f'{category_id}={name}' for category_id, name in rows)
+
+
+def make_etag(*parts):
+    # query arguments are part of the tag, so every page has its own
+    raw = ':'.join(str(part) for part in parts) + '?' + request.query_string.decode('latin-1')
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def conditional(compute_etag, cache=False):
+    # outermost decorator of a JWT protected GET; compute_etag gets the
+    # handler's arguments and returns a tag, or None to skip caching. With
+    # cache=True the serialized 200 response is kept in the response cache
+    # under its tag, the handler needs a category_id argument for invalidation
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+            tag = compute_etag(*args, **kwargs)
+            if tag is None:
+                return f(*args, **kwargs)
+
+            headers = {'ETag': f'"{tag}"', 'Cache-Control': 'private, no-cache'}
+            if request.if_none_match.contains(tag):
+                return None, 304, headers
+
+            if cache:
+                entry = response_cache.get(tag)
+                if entry is not None:
+                    return response_cache.response(entry, headers)
+
+            data, code, response_headers = unpack(f(*args, **kwargs))
+            if code != 200:
+                return data, code, response_headers
+            response_headers = {**dict(response_headers), **headers}
+            if cache:
+                return response_cache.store(tag, kwargs.get('category_id'), data, response_headers)
+            if isinstance(data, Response):
+                # already encoded, e.g. by serialization.list_response
+                data.headers.update(response_headers)
+                return data
+            return data, code, response_headers
+        return wrapper
+    return decorator
@@ -0,0 +1,77 @@
+"""Compare importing items one request at a time through POST /items with
+a single POST /items/bulk, reporting wall time and SQL statement counts.
+
+Usage: python benchmarks/bench_bulk.py [items] [attributes]   (default 2000 10)
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Category, CategoryAttribute
+
+
+def setup(path, attributes):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'TESTING': True})
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', password='x')
+        db.session.add(user)
+        db.session.flush()
+        category = Category(name='bench', owner_id=user.id)
+        db.session.add(category)
+        db.session.flush()
+        attrs = [CategoryAttribute(category_id=category.id, name=f'attr {i}', attribute_type='string')
+                 for i in range(attributes)]
+        db.session.add_all(attrs)
+        db.session.commit()
+        headers = {'Authorization': 'Bearer ' + create_access_token(identity=str(user.id))}
+        return app, headers, category.id, [attr.id for attr in attrs]
+
+
+def run(label, path, items, attributes, send):
+    app, headers, category_id, field_ids = setup(path, attributes)
+    statements = [0]
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.__setitem__(0, statements[0] + 1))
+
+    client = app.test_client()
+    values = [{'field_id': field_id, 'value': f'value {field_id}'} for field_id in field_ids]
+    start = time.perf_counter()
+    send(client, headers, category_id, values)
+    elapsed = time.perf_counter() - start
+    print(f'{label:8} {items:7} items  {elapsed:8.2f}s  {items / elapsed:10.0f} items/s  {statements[0]:8} statements')
+
+
+def single(items):
+    def send(client, headers, category_id, values):
+        for _ in range(items):
+            r = client.post('/items', json={'category_id': category_id, 'values': values}, headers=headers)
+            assert r.status_code == 201, r.json
+    return send
+
+
+def bulk(items, chunk=5000):
+    def send(client, headers, category_id, values):
+        for start in range(0, items, chunk):
+            ops = [{'action': 'create', 'values': values} for _ in range(min(chunk, items - start))]
+            r = client.post('/items/bulk', json={'category_id': category_id, 'items': ops}, headers=headers)
+            assert r.status_code == 200 and r.json['failed'] == 0, r.json
+    return send
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    attributes = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    directory = tempfile.mkdtemp()
+    run('single', os.path.join(directory, 'single.sqlite'), items, attributes, single(items))
+    run('bulk', os.path.join(directory, 'bulk.sqlite'), items, attributes, bulk(items))
+
+
+if __name__ == '__main__':
+    main()
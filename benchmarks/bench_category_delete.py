@@ -0,0 +1,84 @@
+"""Compare deleting a large category the ORM way (children loaded into the
+session and deleted row by row, as cascade='all, delete' did) with the single
+DELETE that ON DELETE CASCADE foreign keys allow.
+
+Usage: python benchmarks/bench_category_delete.py [items]   (default 100000)
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, event, func, text
+from sqlalchemy.orm import selectinload
+from app import create_app, db
+from app.models import Activity, Category, Item, ItemAttributeValue
+from bench_projection import seed
+
+
+def orm_delete(category_id):
+    # as before the migration: no foreign key enforcement, so feed activity stays behind
+    db.session.execute(text('PRAGMA foreign_keys = OFF'))
+    category = db.session.get(Category, category_id, options=[
+        selectinload(Category.attributes),
+        selectinload(Category.items).selectinload(Item.values),
+    ])
+    # loaded children are still deleted one by one, passive_deletes only skips loading them
+    db.session.delete(category)
+    db.session.commit()
+
+
+def cascade_delete(category_id):
+    db.session.execute(delete(Category).where(Category.id == category_id))
+    db.session.commit()
+
+
+def measure(path, label, fn, category_id):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'TESTING': True})
+    with app.app_context():
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            # an executemany runs its statement once per parameter set
+            statements.append(len(parameters) if executemany else 1)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        start = time.perf_counter()
+        fn(category_id)
+        elapsed = time.perf_counter() - start
+        left = [db.session.query(func.count()).select_from(model).scalar()
+                for model in (Item, ItemAttributeValue, Activity)]
+        left.append(db.session.execute(text('SELECT count(*) FROM item_search')).scalar())
+    print(f'{label:24} {elapsed:8.2f} s {sum(statements):9d} statements   '
+          f'left: {left[0]} items, {left[1]} values, {left[2]} activities, {left[3]} search rows')
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'delete.sqlite')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'TESTING': True})
+
+    start = time.perf_counter()
+    owner_id, category_id = seed(app, items)
+    with app.app_context():
+        db.session.execute(text(
+            "INSERT INTO activity (actor_id, item_id, category_id, verb, created_at, fanned_out) "
+            "SELECT owner_id, id, category_id, 'created', CURRENT_TIMESTAMP, 1 FROM item"
+        ))
+        db.session.commit()
+        # checkpoints the WAL into the file before it is copied
+        db.engine.dispose()
+    print(f'seeded {items} items in {time.perf_counter() - start:.1f}s\n')
+
+    copy = os.path.join(directory, 'delete-copy.sqlite')
+    shutil.copy(path, copy)
+    measure(path, 'ORM, row by row', orm_delete, category_id)
+    measure(copy, 'ON DELETE CASCADE', cascade_delete, category_id)
+
+
+if __name__ == '__main__':
+    main()
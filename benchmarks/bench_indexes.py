@@ -0,0 +1,120 @@
+"""Seed a large SQLite database and compare query plans and timings of the
+hot access paths before and after the access path indexes migration.
+
+Usage: python benchmarks/bench_indexes.py [values]   (default 1,000,000)
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+USERS = 1000
+CATEGORIES_PER_USER = 5
+ATTRIBUTES_PER_CATEGORY = 10
+FOLLOWS_PER_USER = 20
+
+# schema as of revision af6430756ec9 (no secondary indexes)
+SCHEMA = """
+CREATE TABLE user (id INTEGER PRIMARY KEY, email VARCHAR(120) NOT NULL UNIQUE, password VARCHAR(128));
+CREATE TABLE category (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, owner_id INTEGER NOT NULL);
+CREATE TABLE category_attribute (id INTEGER PRIMARY KEY, category_id INTEGER NOT NULL,
+    name VARCHAR(100) NOT NULL, attribute_type VARCHAR(20) NOT NULL);
+CREATE TABLE item (id INTEGER PRIMARY KEY, category_id INTEGER NOT NULL, owner_id INTEGER NOT NULL);
+CREATE TABLE item_attribute_value (id INTEGER PRIMARY KEY, item_id INTEGER NOT NULL,
+    field_id INTEGER NOT NULL, value VARCHAR(255) NOT NULL);
+CREATE TABLE follow (id INTEGER PRIMARY KEY, follower_id INTEGER NOT NULL, followed_id INTEGER NOT NULL);
+"""
+
+# mirrors migrations/versions/4cdda5722202_added_access_path_indexes.py
+INDEXES = """
+CREATE INDEX ix_item_owner_id_category_id ON item (owner_id, category_id);
+CREATE INDEX ix_item_attribute_value_item_id ON item_attribute_value (item_id);
+CREATE INDEX ix_category_attribute_category_id ON category_attribute (category_id);
+CREATE UNIQUE INDEX uq_category_owner_id_name ON category (owner_id, name);
+CREATE UNIQUE INDEX uq_follow_follower_id_followed_id ON follow (follower_id, followed_id);
+"""
+
+# the statements issued by the routes, with representative parameters
+QUERIES = {
+    'items by owner/category': (
+        'SELECT id FROM item WHERE owner_id = ? AND category_id = ?', (500, 2500)),
+    'values by item': (
+        'SELECT field_id, value FROM item_attribute_value WHERE item_id = ?', (12345,)),
+    'attributes by category': (
+        'SELECT id, name FROM category_attribute WHERE category_id = ?', (2500,)),
+    'category by owner/name': (
+        'SELECT id FROM category WHERE owner_id = ? AND name = ?', (500, 'category 2')),
+    'follow edge': (
+        'SELECT id FROM follow WHERE follower_id = ? AND followed_id = ?', (500, 501)),
+}
+
+
+def seed(conn, values):
+    rng = random.Random(42)
+    items = max(values // ATTRIBUTES_PER_CATEGORY, 1)
+    categories = USERS * CATEGORIES_PER_USER
+
+    conn.executemany('INSERT INTO user (id, email) VALUES (?, ?)',
+                     ((u, f'user{u}@example.com') for u in range(1, USERS + 1)))
+    conn.executemany('INSERT INTO category (id, name, owner_id) VALUES (?, ?, ?)',
+                     ((c, f'category {c % CATEGORIES_PER_USER}', (c - 1) // CATEGORIES_PER_USER + 1)
+                      for c in range(1, categories + 1)))
+    conn.executemany('INSERT INTO category_attribute (category_id, name, attribute_type) VALUES (?, ?, ?)',
+                     ((c, f'attr {a}', 'string')
+                      for c in range(1, categories + 1) for a in range(ATTRIBUTES_PER_CATEGORY)))
+    conn.executemany('INSERT INTO follow (follower_id, followed_id) VALUES (?, ?)',
+                     ((u, (u + f) % USERS + 1)
+                      for u in range(1, USERS + 1) for f in range(FOLLOWS_PER_USER)))
+
+    item_rows = []
+    for i in range(1, items + 1):
+        category_id = rng.randint(1, categories)
+        item_rows.append((i, category_id, (category_id - 1) // CATEGORIES_PER_USER + 1))
+    conn.executemany('INSERT INTO item (id, category_id, owner_id) VALUES (?, ?, ?)', item_rows)
+
+    def value_rows():
+        for item_id, category_id, _ in item_rows:
+            first_field = (category_id - 1) * ATTRIBUTES_PER_CATEGORY + 1
+            for a in range(ATTRIBUTES_PER_CATEGORY):
+                yield item_id, first_field + a, f'value {item_id}-{a}'
+    conn.executemany('INSERT INTO item_attribute_value (item_id, field_id, value) VALUES (?, ?, ?)',
+                     value_rows())
+    conn.commit()
+
+
+def report(conn, label, repeat=20):
+    print(f'\n== {label}')
+    for name, (sql, params) in QUERIES.items():
+        plan = '; '.join(row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+        start = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, params).fetchall()
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        print(f'{name:26} {elapsed:9.3f} ms  {plan}')
+
+
+def main():
+    values = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    path = os.path.join(tempfile.mkdtemp(), 'bench.sqlite')
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+
+    start = time.perf_counter()
+    seed(conn, values)
+    print(f'seeded {values} values into {path} in {time.perf_counter() - start:.1f}s')
+
+    report(conn, 'before migration')
+    start = time.perf_counter()
+    conn.executescript(INDEXES)
+    conn.execute('ANALYZE')
+    print(f'\nindexes built in {time.perf_counter() - start:.1f}s')
+    report(conn, 'after migration')
+
+    conn.close()
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
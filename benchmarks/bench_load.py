@@ -0,0 +1,341 @@
+"""Drive every namespace of the API with concurrent workers against a seeded
+database and report throughput and p50/p95/p99 latency per endpoint as JSON.
+
+Usage: python benchmarks/bench_load.py DB [--seconds 30] [--warmup 3] [--workers 8]
+           [--url http://127.0.0.1:5000] [--read-only] [--output result.json]
+           [--compare baseline.json] [seed.py options]
+
+DB is created with benchmarks/seed.py (same options) when it does not exist.
+Without --url the requests go through the Flask test client in this
+process. With --url they go to a server running on the same database and
+secret key, e.g.
+
+    DATABASE_URL=sqlite:///$PWD/bench.sqlite gunicorn -w 4 'app:create_app()'
+
+The JSON result goes to --output (stdout without it) and a table to stderr;
+--compare prints the change against an earlier result.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import func, select
+from app import create_app, db
+from app.models import Category, CategoryAttribute, Follow, Item, ItemAttributeValue, User
+
+import seed as seeding
+
+FIXTURE_USERS = 500
+
+
+def word(rng):
+    return rng.choice(seeding.WORDS)
+
+
+# name -> (weight, builds (method, path, json body) for a fixture user)
+SCENARIOS = {
+    'auth.login': (1, lambda u, rng: ('POST', '/auth/login', {'email': u['email'], 'password': seeding.PASSWORD})),
+    'dashboard.user': (3, lambda u, rng: ('GET', '/dashboard/user', None)),
+    'categories.list': (5, lambda u, rng: ('GET', '/categories', None)),
+    'categories.detail': (5, lambda u, rng: ('GET', f"/categories/{rng.choice(u['categories'])['id']}", None)),
+    'items.list': (10, lambda u, rng: ('GET', f"/items/all/{rng.choice(u['categories'])['id']}?limit=50", None)),
+    'items.detail': (10, lambda u, rng: ('GET', f"/items/details/{u['item_id']}", None)),
+    'items.query': (3, lambda u, rng: ('POST', f"/items/query/{u['categories'][0]['id']}", {
+        'filters': [{'field_id': u['categories'][0]['number_field'], 'op': 'between', 'min': '100', 'max': '5000'}],
+        'limit': 50})),
+    'items.create': (2, lambda u, rng: ('POST', '/items', {
+        'category_id': u['categories'][0]['id'],
+        'values': [{'field_id': u['categories'][0]['string_field'], 'value': f'{word(rng)} {word(rng)}'}]})),
+    'follow.list': (3, lambda u, rng: ('GET', '/follow/?limit=50', None)),
+    'explore.categories': (5, lambda u, rng: ('GET', f"/explore/{u['followed_id']}/categories", None)),
+    'explore.items': (8, lambda u, rng: (
+        'GET', f"/explore/{u['followed_id']}/items/{u['followed_category_id']}?limit=50", None)),
+    'explore.collection': (1, lambda u, rng: ('GET', f"/explore/{u['followed_id']}/collection", None)),
+    'export.csv': (1, lambda u, rng: ('GET', f"/export/{u['categories'][0]['id']}?format=csv", None)),
+    'search': (3, lambda u, rng: ('GET', f'/search?q={word(rng)}&limit=20', None)),
+    'feed': (5, lambda u, rng: ('GET', '/feed?limit=50', None)),
+}
+
+WRITE_SCENARIOS = {'items.create'}
+
+
+def load_fixtures(app, count, rng):
+    # users with a category, an item and a followed user that has a category
+    with app.app_context():
+        max_user = db.session.query(func.max(User.id)).scalar() or 0
+        user_ids = rng.sample(range(1, max_user + 1), min(count * 2, max_user))
+
+        categories = {}
+        for category_id, owner_id in db.session.execute(
+                select(Category.id, Category.owner_id).where(Category.owner_id.in_(user_ids))):
+            categories.setdefault(owner_id, []).append({'id': category_id})
+        fields = {}
+        for attr_id, category_id, attribute_type in db.session.execute(
+                select(CategoryAttribute.id, CategoryAttribute.category_id, CategoryAttribute.attribute_type)
+                .join(Category).where(Category.owner_id.in_(user_ids))):
+            fields.setdefault((category_id, attribute_type), attr_id)
+        items = dict(db.session.execute(
+            select(Item.owner_id, func.min(Item.id)).where(Item.owner_id.in_(user_ids)).group_by(Item.owner_id)).all())
+        followed = dict(db.session.execute(
+            select(Follow.follower_id, func.min(Follow.followed_id))
+            .where(Follow.follower_id.in_(user_ids)).group_by(Follow.follower_id)).all())
+        followed_categories = dict(db.session.execute(
+            select(Item.owner_id, func.min(Item.category_id))
+            .where(Item.owner_id.in_(list(followed.values()))).group_by(Item.owner_id)).all())
+        emails = dict(db.session.execute(select(User.id, User.email).where(User.id.in_(user_ids))).all())
+
+        fixtures = []
+        for user_id in user_ids:
+            followed_id = followed.get(user_id)
+            if not categories.get(user_id) or user_id not in items or followed_id not in followed_categories:
+                continue
+            for category in categories[user_id]:
+                category['string_field'] = fields.get((category['id'], 'string'))
+                category['number_field'] = fields.get((category['id'], 'number'))
+            fixtures.append({
+                'id': user_id,
+                'email': emails[user_id],
+                'token': create_access_token(identity=str(user_id)),
+                'categories': categories[user_id],
+                'item_id': items[user_id],
+                'followed_id': followed_id,
+                'followed_category_id': followed_categories[followed_id],
+            })
+            if len(fixtures) == count:
+                break
+        if not fixtures:
+            raise SystemExit('no usable users in the database, seed it with benchmarks/seed.py')
+        return fixtures
+
+
+def dataset_counts(app):
+    with app.app_context():
+        return {
+            name: db.session.query(func.count(column)).scalar()
+            for name, column in (('users', User.id), ('follows', Follow.id), ('categories', Category.id),
+                                 ('items', Item.id), ('values', ItemAttributeValue.id))
+        }
+
+
+class TestClientTransport:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body, headers):
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        response.get_data()  # drains streamed bodies
+        response.close()
+        return response.status_code
+
+
+class HttpTransport:
+    # one keep-alive connection per worker, reopened when the server closes it
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.conn = None
+
+    def request(self, method, path, body, headers):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = dict(headers, **({'Content-Type': 'application/json'} if data is not None else {}))
+        try:
+            self.conn.request(method, path, body=data, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            self.conn.close()
+            self.conn = None
+            raise
+        if response.will_close:
+            self.conn.close()
+            self.conn = None
+        return response.status
+
+
+def worker(index, make_transport, fixtures, scenarios, seed, warmup_until, stop_at, results, lock):
+    rng = random.Random(seed * 1000 + index)
+    transport = make_transport()
+    names = list(scenarios)
+    weights = [scenarios[name][0] for name in names]
+    latencies = {name: [] for name in names}
+    statuses = {name: Counter() for name in names}
+
+    while True:
+        now = time.perf_counter()
+        if now >= stop_at:
+            break
+        name = rng.choices(names, weights)[0]
+        user = rng.choice(fixtures)
+        method, path, body = scenarios[name][1](user, rng)
+        headers = {'Authorization': f"Bearer {user['token']}"}
+
+        started = time.perf_counter()
+        try:
+            status = transport.request(method, path, body, headers)
+        except Exception:
+            status = 'error'
+        elapsed = time.perf_counter() - started
+        if started >= warmup_until:
+            latencies[name].append(elapsed)
+            statuses[name][str(status)] += 1
+
+    with lock:
+        for name in names:
+            results['latencies'][name].extend(latencies[name])
+            results['statuses'][name].update(statuses[name])
+
+
+def percentile(ordered, fraction):
+    # nearest rank
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, statuses, seconds):
+    ordered = sorted(latencies)
+    errors = sum(count for status, count in statuses.items() if status == 'error' or int(status) >= 500)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'statuses': dict(sorted(statuses.items())),
+        'throughput': round(len(ordered) / seconds, 2),
+        'mean_ms': ms(sum(ordered) / len(ordered)) if ordered else None,
+        'p50_ms': ms(percentile(ordered, 0.50)),
+        'p95_ms': ms(percentile(ordered, 0.95)),
+        'p99_ms': ms(percentile(ordered, 0.99)),
+        'max_ms': ms(ordered[-1]) if ordered else None,
+    }
+
+
+def git_commit():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=root, text=True).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                             cwd=root, text=True).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def print_table(result, baseline=None, out=sys.stderr):
+    header = f"{'endpoint':22} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    if baseline:
+        header += f" {'req/s chg':>10} {'p95 chg':>9}"
+    print(header, file=out)
+
+    rows = list(result['endpoints'].items()) + [('total', result['total'])]
+    for name, stats in rows:
+        fmt = lambda value: f'{value:9.2f}' if value is not None else f"{'-':>9}"
+        line = (f"{name:22} {stats['throughput']:9.1f} {fmt(stats['p50_ms'])} {fmt(stats['p95_ms'])} "
+                f"{fmt(stats['p99_ms'])} {stats['errors']:7}")
+        old = baseline['total'] if name == 'total' and baseline else (baseline or {}).get('endpoints', {}).get(name)
+        if old:
+            change = lambda new, before: f'{(new - before) / before * 100:+9.1f}%' if new and before else f"{'-':>10}"
+            line += f" {change(stats['throughput'], old['throughput'])} {change(stats['p95_ms'], old['p95_ms'])}"
+        print(line, file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('db', help='SQLite file, seeded first when missing')
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=3, help='seconds not recorded at the start')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--url', help='base url of a running server instead of the test client')
+    parser.add_argument('--read-only', action='store_true', help='skip the endpoints that write')
+    parser.add_argument('--output', help='write the JSON result here instead of stdout')
+    parser.add_argument('--compare', help='earlier JSON result to compare with')
+    seeding.add_arguments(parser)
+    args = parser.parse_args()
+
+    path = os.path.abspath(args.db)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    if not os.path.exists(path):
+        seeding.seed(app, args.users, args.follows, args.categories, args.attributes, args.items, args.seed,
+                     log=lambda line: print(line, file=sys.stderr))
+
+    rng = random.Random(args.seed)
+    fixtures = load_fixtures(app, FIXTURE_USERS, rng)
+    scenarios = {name: spec for name, spec in SCENARIOS.items()
+                 if not (args.read_only and name in WRITE_SCENARIOS)}
+    if args.url:
+        make_transport = lambda: HttpTransport(args.url)
+    else:
+        make_transport = lambda: TestClientTransport(app)
+
+    results = {'latencies': {name: [] for name in scenarios}, 'statuses': {name: Counter() for name in scenarios}}
+    lock = threading.Lock()
+    started = time.perf_counter()
+    warmup_until = started + args.warmup
+    stop_at = warmup_until + args.seconds
+    threads = [
+        threading.Thread(target=worker, args=(n, make_transport, fixtures, scenarios, args.seed,
+                                              warmup_until, stop_at, results, lock))
+        for n in range(args.workers)
+    ]
+    print(f'{len(fixtures)} fixture users, {args.workers} workers, {args.warmup:g}s warmup + '
+          f'{args.seconds:g}s against {args.url or "the test client"}', file=sys.stderr)
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    commit, dirty = git_commit()
+    all_latencies = [value for values in results['latencies'].values() for value in values]
+    all_statuses = sum(results['statuses'].values(), Counter())
+    result = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'target': args.url or 'test-client',
+            'workers': args.workers,
+            'seconds': args.seconds,
+            'read_only': args.read_only,
+            'seed': args.seed,
+            'python': sys.version.split()[0],
+            'sqlite': sqlite3.sqlite_version,
+            'dataset': dataset_counts(app),
+        },
+        'endpoints': {
+            name: summarize(results['latencies'][name], results['statuses'][name], args.seconds)
+            for name in scenarios
+        },
+        'total': summarize(all_latencies, all_statuses, args.seconds),
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_table(result, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
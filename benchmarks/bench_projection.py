@@ -0,0 +1,120 @@
+"""Compare loading items as ORM instances (Item.query with selectinload) with the
+column projections of app/repository.py, for time and peak memory.
+
+Usage: python benchmarks/bench_projection.py [items]   (default 50000)
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app import repository
+from sqlalchemy.orm import selectinload
+from app.models import User, Category, CategoryAttribute, Item
+
+VALUES_PER_ITEM = 5
+BATCH_SIZE = 10000
+PAGE_SIZE = 500
+
+
+def seed(app, items):
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', password='x')
+        db.session.add(user)
+        db.session.flush()
+        category = Category(name='bench', owner_id=user.id)
+        db.session.add(category)
+        db.session.flush()
+        attrs = [CategoryAttribute(category_id=category.id, name=f'field {n}', attribute_type='string')
+                 for n in range(VALUES_PER_ITEM)]
+        db.session.add_all(attrs)
+        db.session.flush()
+
+        for start in range(0, items, BATCH_SIZE):
+            ids = repository.insert_items(user.id, category.id, min(BATCH_SIZE, items - start))
+            repository.insert_values([
+                repository.value_row(item_id, attr.id, f'value {item_id}/{attr.id}', 'string')
+                for item_id in ids
+                for attr in attrs
+            ])
+        db.session.commit()
+        return user.id, category.id
+
+
+def items_query(owner_id, category_id):
+    # the ORM read path the routes used before the projections: items plus
+    # one IN query for all of their values
+    return (
+        Item.query
+        .options(selectinload(Item.values))
+        .filter_by(owner_id=owner_id, category_id=category_id)
+    )
+
+
+def serialize_item(item, names):
+    return {
+        'id': item.id,
+        'category_id': item.category_id,
+        'values': repository.serialize_values(item.values, names)
+    }
+
+
+def orm_list(owner_id, category_id, limit=None):
+    names = repository.attribute_names(category_id)
+    query = items_query(owner_id, category_id)
+    items = query.limit(limit).all() if limit else query.all()
+    return [serialize_item(item, names) for item in items]
+
+
+def projection_list(owner_id, category_id, limit=None):
+    names = repository.attribute_names(category_id)
+    query = repository.item_rows_query(owner_id, category_id)
+    rows = query.limit(limit).all() if limit else query.all()
+    return repository.serialize_rows(rows, names)
+
+
+def measure(app, label, fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        with app.app_context():
+            start = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    with app.app_context():
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    print(f'{label:38} {best * 1000:9.1f} ms {peak / 1e6:9.1f} MB peak '
+          f'{len(result) / best:10.0f} items/s')
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    path = os.path.join(tempfile.mkdtemp(), 'projection.sqlite')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'TESTING': True})
+
+    start = time.perf_counter()
+    owner_id, category_id = seed(app, items)
+    print(f'seeded {items} items ({items * VALUES_PER_ITEM} values) in {time.perf_counter() - start:.1f}s\n')
+
+    print(f'whole category ({items} items)')
+    measure(app, '  ORM instances', lambda: orm_list(owner_id, category_id))
+    measure(app, '  column projection', lambda: projection_list(owner_id, category_id))
+    print(f'\none page ({PAGE_SIZE} items)')
+    measure(app, '  ORM instances', lambda: orm_list(owner_id, category_id, PAGE_SIZE), repeat=10)
+    measure(app, '  column projection', lambda: projection_list(owner_id, category_id, PAGE_SIZE), repeat=10)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Compare the attribute query endpoint with loading a whole category and
+filtering it in Python, which is what clients had to do before.
+
+Usage: python benchmarks/bench_query.py [items]   (default 100000)
+"""
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app import querying, repository
+from app.models import User, Category, CategoryAttribute
+from bench_projection import items_query, serialize_item
+
+BATCH_SIZE = 10000
+
+
+def seed(app, items):
+    rng = random.Random(7)
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', password='x')
+        db.session.add(user)
+        db.session.flush()
+        category = Category(name='bench', owner_id=user.id)
+        db.session.add(category)
+        db.session.flush()
+        attrs = [
+            CategoryAttribute(category_id=category.id, name='name', attribute_type='string'),
+            CategoryAttribute(category_id=category.id, name='price', attribute_type='number'),
+            CategoryAttribute(category_id=category.id, name='acquired', attribute_type='date'),
+        ]
+        db.session.add_all(attrs)
+        db.session.flush()
+
+        for start in range(0, items, BATCH_SIZE):
+            ids = repository.insert_items(user.id, category.id, min(BATCH_SIZE, items - start))
+            rows = []
+            for item_id in ids:
+                acquired = datetime.date(2000, 1, 1) + datetime.timedelta(days=rng.randint(0, 9000))
+                rows.append(repository.value_row(item_id, attrs[0].id, f'item {item_id:07d}', 'string'))
+                rows.append(repository.value_row(item_id, attrs[1].id, str(rng.randint(1, 100000) / 100), 'number'))
+                rows.append(repository.value_row(item_id, attrs[2].id, acquired.isoformat(), 'date'))
+            repository.insert_values(rows)
+        db.session.commit()
+        token = create_access_token(identity=str(user.id))
+        return user.id, category.id, [attr.id for attr in attrs], {'Authorization': f'Bearer {token}'}
+
+
+def python_filter(owner_id, category_id, field_ids, low, high):
+    # the old way: materialize every item, then filter and sort in Python
+    name_id, price_id, acquired_id = field_ids
+    names = repository.attribute_names(category_id)
+    matches = []
+    for item in items_query(owner_id, category_id):
+        values = {val.field_id: val.value for val in item.values}
+        if low <= float(values[price_id]) <= high:
+            matches.append(serialize_item(item, names))
+            matches[-1]['_acquired'] = values[acquired_id]
+    matches.sort(key=lambda item: item['_acquired'], reverse=True)
+    return matches[:50]
+
+
+def timed(label, fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'{label:40} {best * 1000:10.1f} ms')
+    return result
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    path = os.path.join(tempfile.mkdtemp(), 'query.sqlite')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'TESTING': True})
+
+    start = time.perf_counter()
+    owner_id, category_id, field_ids, headers = seed(app, items)
+    print(f'seeded {items} items ({items * 3} values) in {time.perf_counter() - start:.1f}s\n')
+
+    name_id, price_id, acquired_id = field_ids
+    spec = {
+        'filters': [{'field_id': price_id, 'op': 'between', 'min': '100', 'max': '110'}],
+        'sort': {'field_id': acquired_id, 'direction': 'desc'},
+        'limit': 50,
+    }
+    client = app.test_client()
+
+    timed('query endpoint: price range, sort by date',
+          lambda: client.post(f'/items/query/{category_id}', json=spec, headers=headers))
+    timed('query endpoint: name prefix',
+          lambda: client.post(f'/items/query/{category_id}', headers=headers, json={
+              'filters': [{'field_id': name_id, 'op': 'prefix', 'value': 'item 00012'}]}))
+    with app.app_context():
+        timed('python: load category, filter, sort',
+              lambda: python_filter(owner_id, category_id, field_ids, 100, 110), repeat=1)
+
+        attributes = {attr.id: attr for attr in CategoryAttribute.query.filter_by(category_id=category_id)}
+        stmt, _, _ = querying.build_query(owner_id, category_id, attributes, spec, 50)
+        compiled = stmt.compile(db.engine, compile_kwargs={'literal_binds': True})
+        print('\nplan of the compiled statement:')
+        for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {compiled}')):
+            print('  ', row[-1])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Compare flask-restx marshalling with the compiled encoders of
+app/serialization.py on item and category lists.
+
+Usage: python benchmarks/bench_serialize.py [items]   (default 5000)
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_restx import marshal
+from app import create_app, serialization
+from app.routes.categories import category_model
+from app.routes.items import item_model
+
+
+class Row:
+    # stands in for an ORM instance, marshal() reads attributes the same way
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def item_dicts(count, values=5):
+    return [
+        {
+            'id': item_id,
+            'category_id': 1,
+            'values': [
+                {'attribute_name': f'attribute {field_id}', 'value': f'value {item_id}/{field_id}', 'field_id': field_id}
+                for field_id in range(values)
+            ]
+        }
+        for item_id in range(count)
+    ]
+
+
+def timed(label, fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'{label:45} {best * 1000:9.2f} ms')
+    return best
+
+
+def compare(title, rows, model):
+    encode = serialization.compile_encoder(model)
+    print(title)
+    slow = timed('  restx marshal + json.dumps', lambda: json.dumps(marshal(rows, model)).encode('utf-8'))
+    timed('  compiled encoder + json.dumps', lambda: json.dumps([encode(row) for row in rows]).encode('utf-8'))
+    if serialization.orjson is not None:
+        fast = timed('  compiled encoder + orjson', lambda: serialization.dumps([encode(row) for row in rows]))
+        print(f'  speedup {slow / fast:.1f}x')
+    else:
+        print('  orjson not installed')
+    print()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    app = create_app()
+    with app.app_context():
+        compare(f'{count} items, 5 values each', item_dicts(count), item_model)
+        compare(f'{count} categories (ORM-like objects)',
+                [Row(id=i, name=f'category {i}') for i in range(count)], category_model)
+
+
+if __name__ == '__main__':
+    main()
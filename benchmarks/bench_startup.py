@@ -0,0 +1,125 @@
+"""Measure the cold start of a worker process (import app + create_app) with
+python -X importtime and guard it against regressions.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--top 15]
+           [--max-ms MS] [--output startup.json] [--compare startup.json]
+           [--tolerance 0.25]
+
+Each run is a fresh interpreter. The report lists the median wall time, the
+median importtime total and the packages that take longest to import. The
+exit status is 1 when a lazily loaded dependency (PDF rendering, migrations)
+is imported at startup, when the median exceeds --max-ms, or when it is more
+than --tolerance slower than the --compare results.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# must stay out of sys.modules until a PDF export or `flask db` needs them
+LAZY_MODULES = ('xhtml2pdf', 'reportlab', 'PIL', 'html5lib', 'pyhanko', 'alembic', 'flask_migrate')
+
+CHILD = f'''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app()
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+'''
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| +(\S+)$')
+
+
+def parse_importtime(stderr):
+    # total import time and the own (self) time of every top-level package,
+    # summed over its modules
+    total = 0
+    packages = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, name = int(match.group(1)), match.group(3)
+        total += self_us
+        package = name.split('.', 1)[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return total, packages
+
+
+def run_once():
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    child = json.loads(result.stdout.strip().splitlines()[-1])
+    total, packages = parse_importtime(result.stderr)
+    return child['seconds'], total / 1e6, packages, child['loaded']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='slowest packages to list')
+    parser.add_argument('--max-ms', type=float, default=None, help='fail above this median wall time')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--compare', help='JSON of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against --compare')
+    args = parser.parse_args()
+
+    walls, imports, loaded = [], [], set()
+    packages = {}
+    for _ in range(args.runs):
+        wall, total, run_packages, lazy_loaded = run_once()
+        walls.append(wall)
+        imports.append(total)
+        loaded.update(lazy_loaded)
+        for package, us in run_packages.items():
+            packages.setdefault(package, []).append(us)
+
+    median_ms = statistics.median(walls) * 1000
+    results = {
+        'runs': args.runs,
+        'wall_ms': round(median_ms, 1),
+        'import_ms': round(statistics.median(imports) * 1000, 1),
+        'packages_ms': {
+            package: round(statistics.median(us) / 1000, 1)
+            for package, us in sorted(packages.items(), key=lambda item: -statistics.median(item[1]))[:args.top]
+        },
+        'lazy_modules_loaded': sorted(loaded),
+    }
+
+    print(f"import app + create_app: {results['wall_ms']:.1f} ms median of {args.runs} runs "
+          f"({results['import_ms']:.1f} ms in imports)")
+    for package, ms in results['packages_ms'].items():
+        print(f'  {package:32} {ms:8.1f} ms')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failures = []
+    if loaded:
+        failures.append(f"imported at startup: {', '.join(sorted(loaded))}")
+    if args.max_ms is not None and median_ms > args.max_ms:
+        failures.append(f'{median_ms:.1f} ms is over --max-ms {args.max_ms:.1f}')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['wall_ms']
+        change = median_ms / baseline - 1
+        print(f'against {args.compare}: {baseline:.1f} ms -> {median_ms:.1f} ms ({change:+.0%})')
+        if change > args.tolerance:
+            failures.append(f'{change:+.0%} slower than {args.compare}')
+
+    for failure in failures:
+        print(f'FAIL {failure}', file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
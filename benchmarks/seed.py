@@ -0,0 +1,145 @@
+"""Seed a SQLite database with a synthetic, reproducible collection: users,
+follows, categories with typed attributes, items, their values and the
+activity of every item. All users share the password 'benchmark'.
+
+Usage: python benchmarks/seed.py PATH [--users 10000] [--follows 20]
+           [--categories 3] [--attributes 5] [--items 200000] [--seed 7]
+
+The defaults give 1M values. The same arguments always produce the same
+rows, so load test results (benchmarks/bench_load.py) compare across commits.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert
+from app import create_app, db
+from app import passwords, repository, search
+from app.models import Activity, Category, CategoryAttribute, Follow, Item, ItemAttributeValue, User, utcnow
+
+PASSWORD = 'benchmark'
+BATCH_SIZE = 10000
+
+ATTRIBUTE_TYPES = ('string', 'number', 'date', 'string', 'number')
+WORDS = (
+    'red', 'blue', 'green', 'vintage', 'mint', 'signed', 'rare', 'boxed', 'first', 'edition',
+    'lens', 'stamp', 'coin', 'vinyl', 'card', 'figure', 'poster', 'watch', 'comic', 'camera',
+)
+
+
+def email(user_index):
+    return f'user{user_index}@bench.example.com'
+
+
+def _batches(rows, size=BATCH_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _insert(model, rows):
+    for batch in _batches(rows):
+        db.session.execute(insert(model), batch)
+
+
+def _value(rng, attribute_type):
+    if attribute_type == 'number':
+        return str(rng.randint(1, 1000000) / 100)
+    if attribute_type == 'date':
+        return (datetime.date(1990, 1, 1) + datetime.timedelta(days=rng.randint(0, 12000))).isoformat()
+    return ' '.join(rng.choice(WORDS) for _ in range(3))
+
+
+def seed(app, users=10000, follows=20, categories=3, attributes=5, items=200000, seed=7, log=print):
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    with app.app_context():
+        db.create_all()
+        if db.session.query(func.count(User.id)).scalar():
+            raise SystemExit('database is not empty')
+
+        # one hash for everybody, bcrypt per user would dominate seeding
+        hashed = passwords._generate(PASSWORD, app.config['BCRYPT_LOG_ROUNDS'])
+        _insert(User, [{'id': n, 'email': email(n), 'password': hashed} for n in range(1, users + 1)])
+
+        edges = []
+        for follower in range(1, users + 1):
+            candidates = rng.sample(range(1, users + 1), min(follows + 1, users))
+            edges.extend({'follower_id': follower, 'followed_id': followed}
+                         for followed in [c for c in candidates if c != follower][:follows])
+        _insert(Follow, edges)
+
+        category_rows = []
+        attribute_rows = []
+        for owner in range(1, users + 1):
+            for n in range(categories):
+                category_id = len(category_rows) + 1
+                category_rows.append({'id': category_id, 'name': f'collection {n}', 'owner_id': owner})
+                for k in range(attributes):
+                    attribute_rows.append({
+                        'id': len(attribute_rows) + 1,
+                        'category_id': category_id,
+                        'name': f'field {k}',
+                        'attribute_type': ATTRIBUTE_TYPES[k % len(ATTRIBUTE_TYPES)],
+                    })
+        _insert(Category, category_rows)
+        _insert(CategoryAttribute, attribute_rows)
+        db.session.commit()
+        log(f'{users} users, {len(edges)} follows, {len(category_rows)} categories, '
+            f'{len(attribute_rows)} attributes in {time.perf_counter() - started:.1f}s')
+
+        now = utcnow()
+        for start in range(0, items, BATCH_SIZE):
+            count = min(BATCH_SIZE, items - start)
+            chosen = [rng.choice(category_rows) for _ in range(count)]
+            ids = range(start + 1, start + count + 1)
+            _insert(Item, [{'id': item_id, 'category_id': category['id'], 'owner_id': category['owner_id'],
+                            'created_at': now, 'updated_at': now}
+                           for item_id, category in zip(ids, chosen)])
+            values = []
+            activity = []
+            for item_id, category in zip(ids, chosen):
+                first_attribute = (category['id'] - 1) * attributes + 1
+                for k in range(attributes):
+                    attribute_type = ATTRIBUTE_TYPES[k % len(ATTRIBUTE_TYPES)]
+                    values.append(repository.value_row(
+                        item_id, first_attribute + k, _value(rng, attribute_type), attribute_type))
+                activity.append({'actor_id': category['owner_id'], 'item_id': item_id,
+                                 'category_id': category['id'], 'verb': 'created', 'created_at': now})
+            repository.insert_values(values)
+            search.reindex(ids)
+            _insert(Activity, activity)
+            db.session.commit()
+            log(f'  {start + count} items in {time.perf_counter() - started:.1f}s')
+
+        value_count = db.session.query(func.count(ItemAttributeValue.id)).scalar()
+        item_count = db.session.query(func.count(Item.id)).scalar()
+        log(f'seeded {item_count} items, {value_count} values in {time.perf_counter() - started:.1f}s')
+
+
+def add_arguments(parser):
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--follows', type=int, default=20, help='followed users per user')
+    parser.add_argument('--categories', type=int, default=3, help='categories per user')
+    parser.add_argument('--attributes', type=int, default=5, help='attributes per category')
+    parser.add_argument('--items', type=int, default=200000, help='items in total')
+    parser.add_argument('--seed', type=int, default=7)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('path', help='SQLite file to create')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(args.path)}'})
+    seed(app, args.users, args.follows, args.categories, args.attributes, args.items, args.seed)
+
+
+if __name__ == '__main__':
+    main()
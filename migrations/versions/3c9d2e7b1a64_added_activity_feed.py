@@ -0,0 +1,93 @@
+"""added activity feed
+
+Revision ID: 3c9d2e7b1a64
+Revises: f631bbc3de40
+Create Date: 2026-10-18 17:02:14.215380
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.search import CREATE_TRIGGER_STATEMENTS, DROP_TRIGGER_STATEMENTS, VALUE_TRIGGER_STATEMENTS
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9d2e7b1a64'
+down_revision = 'f631bbc3de40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('activity',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('actor_id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('verb', sa.String(length=16), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('fanned_out', sa.Boolean(), server_default='1', nullable=False),
+    sa.ForeignKeyConstraint(['actor_id'], ['user.id'], name='fk_activity_actor'),
+    sa.ForeignKeyConstraint(['category_id'], ['category.id'], name='fk_activity_category'),
+    sa.ForeignKeyConstraint(['item_id'], ['item.id'], name='fk_activity_item'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.create_index('ix_activity_actor_id_id', ['actor_id', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_activity_item_id'), ['item_id'], unique=False)
+
+    op.create_table('timeline_entry',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('activity_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['activity_id'], ['activity.id'], name='fk_timelineentry_activity'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_timelineentry_user'),
+    sa.PrimaryKeyConstraint('user_id', 'activity_id')
+    )
+    with op.batch_alter_table('timeline_entry', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_timeline_entry_activity_id'), ['activity_id'], unique=False)
+
+    with op.batch_alter_table('follow', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_follow_followed_id'), ['followed_id'], unique=False)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('feed_timeline', sa.Boolean(), server_default='0', nullable=False))
+
+    # plain ADD COLUMNs, a table rebuild of item would drop the item_search triggers
+    with op.batch_alter_table('item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # existing items get the migration time, they never show up in feeds
+    op.execute('UPDATE item SET created_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP')
+
+
+def downgrade():
+    # dropping the columns rebuilds item, which SQLite refuses while the search triggers exist
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        for statement in DROP_TRIGGER_STATEMENTS:
+            op.execute(statement)
+
+    with op.batch_alter_table('item', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('created_at')
+
+    if sqlite:
+        for statement in CREATE_TRIGGER_STATEMENTS + VALUE_TRIGGER_STATEMENTS:
+            op.execute(statement)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('feed_timeline')
+
+    with op.batch_alter_table('follow', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_follow_followed_id'))
+
+    with op.batch_alter_table('timeline_entry', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_timeline_entry_activity_id'))
+
+    op.drop_table('timeline_entry')
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_activity_item_id'))
+        batch_op.drop_index('ix_activity_actor_id_id')
+
+    op.drop_table('activity')
@@ -0,0 +1,94 @@
+"""added access path indexes
+
+Revision ID: 4cdda5722202
+Revises: af6430756ec9
+Create Date: 2026-10-18 10:12:31.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4cdda5722202'
+down_revision = 'af6430756ec9'
+branch_labels = None
+depends_on = None
+
+
+def rename_duplicate_categories():
+    # a later category with the name of an earlier one of the same owner
+    # becomes "name (2)", "name (3)", ..., skipping names already in use, so
+    # the unique constraint can be created without losing anyone's items
+    bind = op.get_bind()
+    category = sa.table('category', sa.column('id', sa.Integer), sa.column('owner_id', sa.Integer),
+                        sa.column('name', sa.String))
+    owners = (
+        sa.select(category.c.owner_id)
+        .group_by(category.c.owner_id, category.c.name)
+        .having(sa.func.count() > 1)
+    )
+    rows = bind.execute(
+        sa.select(category.c.id, category.c.owner_id, category.c.name)
+        .where(category.c.owner_id.in_(owners))
+        .order_by(category.c.id)
+    ).all()
+
+    taken = {}
+    for row in rows:
+        taken.setdefault(row.owner_id, set()).add(row.name)
+    seen = set()
+    for row in rows:
+        if (row.owner_id, row.name) not in seen:
+            seen.add((row.owner_id, row.name))
+            continue
+        number = 2
+        while True:
+            suffix = f' ({number})'
+            name = row.name[:100 - len(suffix)] + suffix
+            if name not in taken[row.owner_id]:
+                break
+            number += 1
+        taken[row.owner_id].add(name)
+        bind.execute(category.update().where(category.c.id == row.id).values(name=name))
+
+
+def upgrade():
+    # drop duplicate follow rows so the unique constraint can be created
+    op.execute(
+        'DELETE FROM follow WHERE id NOT IN '
+        '(SELECT MIN(id) FROM follow GROUP BY follower_id, followed_id)'
+    )
+
+    with op.batch_alter_table('item', schema=None) as batch_op:
+        batch_op.create_index('ix_item_owner_id_category_id', ['owner_id', 'category_id'], unique=False)
+
+    with op.batch_alter_table('item_attribute_value', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_item_attribute_value_item_id'), ['item_id'], unique=False)
+
+    with op.batch_alter_table('category_attribute', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_category_attribute_category_id'), ['category_id'], unique=False)
+
+    rename_duplicate_categories()
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_category_owner_id_name', ['owner_id', 'name'])
+
+    with op.batch_alter_table('follow', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_follow_follower_id_followed_id', ['follower_id', 'followed_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('follow', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_follow_follower_id_followed_id', type_='unique')
+
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_category_owner_id_name', type_='unique')
+
+    with op.batch_alter_table('category_attribute', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_category_attribute_category_id'))
+
+    with op.batch_alter_table('item_attribute_value', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_item_attribute_value_item_id'))
+
+    with op.batch_alter_table('item', schema=None) as batch_op:
+        batch_op.drop_index('ix_item_owner_id_category_id')
@@ -0,0 +1,36 @@
+"""changed item search to reindex per item
+
+Revision ID: 5e2a9d7c4b18
+Revises: d81e4f2a9c37
+Create Date: 2026-10-19 10:04:31.772915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.search import VALUE_TRIGGER_STATEMENTS
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2a9d7c4b18'
+down_revision = 'd81e4f2a9c37'
+branch_labels = None
+depends_on = None
+
+# the value triggers rebuilt the whole document of an item for every value
+# written; the write paths call app.search.reindex once per item instead
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TRIGGER IF EXISTS item_search_value_delete')
+    op.execute('DROP TRIGGER IF EXISTS item_search_value_update')
+    op.execute('DROP TRIGGER IF EXISTS item_search_value_insert')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in VALUE_TRIGGER_STATEMENTS:
+        op.execute(statement)
@@ -0,0 +1,117 @@
+"""added typed attribute value columns
+
+Revision ID: a51dfefd204e
+Revises: 4cdda5722202
+Create Date: 2026-10-18 13:40:07.215634
+
+"""
+import datetime
+import math
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a51dfefd204e'
+down_revision = '4cdda5722202'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+item_attribute_value = sa.table(
+    'item_attribute_value',
+    sa.column('id', sa.Integer),
+    sa.column('field_id', sa.Integer),
+    sa.column('value', sa.String),
+    sa.column('number_value', sa.Float),
+    sa.column('date_value', sa.DateTime),
+)
+
+category_attribute = sa.table(
+    'category_attribute',
+    sa.column('id', sa.Integer),
+    sa.column('attribute_type', sa.String),
+)
+
+# the attribute types and parsing as of this revision, kept here so later
+# changes to app.attribute_types cannot change what this migration does
+NUMBER_TYPES = {'number', 'float', 'decimal', 'double', 'integer', 'int'}
+BOOLEAN_TYPES = {'boolean', 'bool'}
+DATE_TYPES = {'date'}
+DATETIME_TYPES = {'datetime', 'timestamp'}
+BOOLEAN_VALUES = {'true': 1.0, '1': 1.0, 'yes': 1.0, 'false': 0.0, '0': 0.0, 'no': 0.0}
+
+
+def typed_columns(attribute_type, value):
+    kind = (attribute_type or '').strip().lower()
+    value = str(value).strip()
+    number_value = date_value = None
+
+    try:
+        if kind in NUMBER_TYPES:
+            number_value = float(value)
+            if not math.isfinite(number_value):
+                number_value = None
+        elif kind in BOOLEAN_TYPES:
+            number_value = BOOLEAN_VALUES[value.lower()]
+        elif kind in DATE_TYPES:
+            date_value = datetime.datetime.combine(datetime.date.fromisoformat(value), datetime.time())
+        elif kind in DATETIME_TYPES:
+            date_value = datetime.datetime.fromisoformat(value)
+            if date_value.tzinfo is not None:
+                date_value = date_value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    except (ValueError, KeyError):
+        pass
+
+    return {'number_value': number_value, 'date_value': date_value}
+
+
+def upgrade():
+    with op.batch_alter_table('item_attribute_value', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('number_value', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('date_value', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_item_attribute_value_field_id_number_value', ['field_id', 'number_value'], unique=False)
+        batch_op.create_index('ix_item_attribute_value_field_id_date_value', ['field_id', 'date_value'], unique=False)
+
+    backfill()
+
+
+def backfill():
+    # fill the typed columns of existing rows in keyset batches
+    conn = op.get_bind()
+    update = (
+        item_attribute_value.update()
+        .where(item_attribute_value.c.id == sa.bindparam('value_id'))
+        .values(number_value=sa.bindparam('number_value'), date_value=sa.bindparam('date_value'))
+    )
+
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(item_attribute_value.c.id, item_attribute_value.c.value, category_attribute.c.attribute_type)
+            .join(category_attribute, category_attribute.c.id == item_attribute_value.c.field_id)
+            .where(item_attribute_value.c.id > last_id)
+            .order_by(item_attribute_value.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        params = []
+        for row in rows:
+            typed = typed_columns(row.attribute_type, row.value)
+            if typed['number_value'] is not None or typed['date_value'] is not None:
+                params.append({'value_id': row.id, **typed})
+        if params:
+            conn.execute(update, params)
+
+
+def downgrade():
+    with op.batch_alter_table('item_attribute_value', schema=None) as batch_op:
+        batch_op.drop_index('ix_item_attribute_value_field_id_date_value')
+        batch_op.drop_index('ix_item_attribute_value_field_id_number_value')
+        batch_op.drop_column('date_value')
+        batch_op.drop_column('number_value')
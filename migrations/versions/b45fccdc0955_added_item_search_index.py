@@ -0,0 +1,36 @@
+"""added item search index
+
+Revision ID: b45fccdc0955
+Revises: a51dfefd204e
+Create Date: 2026-10-18 15:02:44.910382
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.search import CREATE_STATEMENTS, DROP_STATEMENTS, REBUILD_STATEMENT, VALUE_TRIGGER_STATEMENTS
+
+
+# revision identifiers, used by Alembic.
+revision = 'b45fccdc0955'
+down_revision = 'a51dfefd204e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 is SQLite only, other databases run without the search index
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for statement in CREATE_STATEMENTS + VALUE_TRIGGER_STATEMENTS:
+        op.execute(statement)
+    op.execute(REBUILD_STATEMENT)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for statement in DROP_STATEMENTS:
+        op.execute(statement)
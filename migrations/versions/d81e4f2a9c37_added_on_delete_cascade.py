@@ -0,0 +1,69 @@
+"""added on delete cascade
+
+Revision ID: d81e4f2a9c37
+Revises: 3c9d2e7b1a64
+Create Date: 2026-10-18 21:12:40.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.search import CREATE_TRIGGER_STATEMENTS, DROP_TRIGGER_STATEMENTS, VALUE_TRIGGER_STATEMENTS
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81e4f2a9c37'
+down_revision = '3c9d2e7b1a64'
+branch_labels = None
+depends_on = None
+
+# (table, constraint, column, referred table) of the foreign keys deleted with their parent row
+CASCADES = [
+    ('category_attribute', 'fk_categoryattribute_category', 'category_id', 'category'),
+    ('item', 'fk_item_category', 'category_id', 'category'),
+    ('item_attribute_value', 'fk_itemattributevalue_item', 'item_id', 'item'),
+    ('item_attribute_value', 'fk_itemattributevalue_field', 'field_id', 'category_attribute'),
+    ('activity', 'fk_activity_item', 'item_id', 'item'),
+    ('activity', 'fk_activity_category', 'category_id', 'category'),
+    ('timeline_entry', 'fk_timelineentry_activity', 'activity_id', 'activity'),
+]
+
+
+def replace_foreign_keys(ondelete):
+    # SQLite rebuilds item and item_attribute_value here, which it refuses
+    # while the search triggers exist; env.py turns foreign keys off so the
+    # rebuilds do not cascade. The value triggers are recreated in the form
+    # that skips items deleted with their values.
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        for statement in DROP_TRIGGER_STATEMENTS:
+            op.execute(statement)
+
+    tables = {}
+    for table, name, column, referred in CASCADES:
+        tables.setdefault(table, []).append((name, column, referred))
+    for table, constraints in tables.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name, column, referred in constraints:
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+    if sqlite:
+        for statement in CREATE_TRIGGER_STATEMENTS + VALUE_TRIGGER_STATEMENTS:
+            op.execute(statement)
+
+
+def upgrade():
+    replace_foreign_keys('CASCADE')
+
+    # AUTOINCREMENT, SQLite would otherwise hand the id of a deleted last category to the next one
+    with op.batch_alter_table('category', schema=None, recreate='always',
+                              table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        pass
+
+
+def downgrade():
+    with op.batch_alter_table('category', schema=None, recreate='always') as batch_op:
+        pass
+
+    replace_foreign_keys(None)
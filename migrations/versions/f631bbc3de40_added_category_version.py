@@ -0,0 +1,26 @@
+"""added category version
+
+Revision ID: f631bbc3de40
+Revises: b45fccdc0955
+Create Date: 2026-10-18 16:21:53.602117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f631bbc3de40'
+down_revision = 'b45fccdc0955'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.drop_column('version')
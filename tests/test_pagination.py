@@ -0,0 +1,59 @@
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app import repository
+from app.models import Category, User
+from app.pagination import DEFAULT_LIMIT, NEXT_CURSOR_HEADER
+
+# lists are paged through the X-Next-Cursor header, which a cross-origin
+# frontend can only read when CORS exposes it
+
+ORIGIN = 'http://frontend.example.com'
+
+
+def make_app():
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'RESPONSE_CACHE': None,
+    })
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed(item_count):
+    owner = User(email='owner@example.com', password='x')
+    db.session.add(owner)
+    db.session.flush()
+    category = Category(name='coins', owner_id=owner.id)
+    db.session.add(category)
+    db.session.flush()
+    item_ids = repository.insert_items(owner.id, category.id, item_count)
+    db.session.commit()
+    return owner.id, category.id, item_ids
+
+
+def test_item_list_pages_through_every_item():
+    app = make_app()
+    with app.app_context():
+        owner_id, category_id, item_ids = seed(DEFAULT_LIMIT * 2 + 1)
+        headers = {
+            'Authorization': f'Bearer {create_access_token(identity=str(owner_id))}',
+            'Origin': ORIGIN,
+        }
+
+    client = app.test_client()
+    seen, pages, url = [], 0, f'/items/all/{category_id}'
+    while url:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.data
+        assert NEXT_CURSOR_HEADER in response.headers['Access-Control-Expose-Headers']
+        assert len(response.json) <= DEFAULT_LIMIT
+        seen.extend(item['id'] for item in response.json)
+        pages += 1
+
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        url = f'/items/all/{category_id}?cursor={cursor}' if cursor else None
+
+    assert pages == 3
+    assert seen == item_ids
@@ -0,0 +1,91 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import create_app, db
+from app import repository
+from app.models import Category, CategoryAttribute, Follow, User
+
+# the number of SQL statements of a read endpoint must not grow with the
+# number of items (no N+1 over items or values)
+
+ATTRIBUTES = 3
+
+
+def seed(item_count):
+    owner = User(email='owner@example.com', password='x')
+    follower = User(email='follower@example.com', password='x')
+    db.session.add_all([owner, follower])
+    db.session.flush()
+    db.session.add(Follow(follower_id=follower.id, followed_id=owner.id))
+
+    category = Category(name='coins', owner_id=owner.id)
+    db.session.add(category)
+    db.session.flush()
+    attributes = [CategoryAttribute(category_id=category.id, name=f'field {n}', attribute_type='string')
+                  for n in range(ATTRIBUTES)]
+    db.session.add_all(attributes)
+    db.session.flush()
+
+    item_ids = repository.insert_items(owner.id, category.id, item_count)
+    repository.insert_values([
+        repository.value_row(item_id, attr.id, f'value {item_id}/{attr.id}', 'string')
+        for item_id in item_ids
+        for attr in attributes
+    ])
+    db.session.commit()
+    return owner.id, follower.id, category.id, item_ids
+
+
+def headers(user_id):
+    return {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+
+
+def count_queries(app, url, user_id):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = app.test_client().get(url, headers=headers(user_id))
+        assert response.status_code == 200, response.data
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements)
+
+
+# url of each endpoint and the user requesting it
+ENDPOINTS = {
+    'item detail': lambda owner_id, follower_id, category_id, item_ids: (f'/items/details/{item_ids[-1]}', owner_id),
+    'item list': lambda owner_id, follower_id, category_id, item_ids: (f'/items/all/{category_id}', owner_id),
+    'explore collection': lambda owner_id, follower_id, category_id, item_ids: (f'/explore/{owner_id}/collection', follower_id),
+    'explore items': lambda owner_id, follower_id, category_id, item_ids: (f'/explore/{owner_id}/items/{category_id}', follower_id),
+}
+
+
+# statements each endpoint runs, whatever the number of items
+EXPECTED_QUERIES = {
+    'item detail': 3,
+    'item list': 4,
+    'explore collection': 5,
+    'explore items': 5,
+}
+
+
+def query_count(endpoint, item_count):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'RESPONSE_CACHE': None,
+    })
+    with app.app_context():
+        db.create_all()
+        url, user_id = ENDPOINTS[endpoint](*seed(item_count))
+        return count_queries(app, url, user_id)
+
+
+@pytest.mark.parametrize('endpoint', sorted(ENDPOINTS))
+def test_query_count_does_not_grow_with_items(endpoint):
+    assert query_count(endpoint, 1) == EXPECTED_QUERIES[endpoint]
+    assert query_count(endpoint, 25) == EXPECTED_QUERIES[endpoint]
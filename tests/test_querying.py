@@ -0,0 +1,64 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app import repository
+from app.models import Category, CategoryAttribute, User
+
+# /items/query sorted by an attribute returns every item once, also when an
+# item has several values for the sort attribute, and pages without gaps
+
+
+def make_app():
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'RESPONSE_CACHE': None,
+    })
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed():
+    owner = User(email='owner@example.com', password='x')
+    db.session.add(owner)
+    db.session.flush()
+    category = Category(name='coins', owner_id=owner.id)
+    db.session.add(category)
+    db.session.flush()
+    year = CategoryAttribute(category_id=category.id, name='year', attribute_type='integer')
+    db.session.add(year)
+    db.session.flush()
+
+    # every item has two years, the last one none
+    item_ids = repository.insert_items(owner.id, category.id, 7)
+    repository.insert_values([
+        repository.value_row(item_id, year.id, str(value), 'integer')
+        for n, item_id in enumerate(item_ids[:-1])
+        for value in (1900 + n, 2000 + n)
+    ])
+    db.session.commit()
+    return owner.id, category.id, year.id, item_ids
+
+
+@pytest.mark.parametrize('direction', ['asc', 'desc'])
+def test_sorted_query_returns_each_item_once(direction):
+    app = make_app()
+    with app.app_context():
+        owner_id, category_id, field_id, item_ids = seed()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(owner_id))}'}
+
+    client = app.test_client()
+    spec = {'sort': {'field_id': field_id, 'direction': direction}, 'limit': 2}
+    seen = []
+    while True:
+        response = client.post(f'/items/query/{category_id}', json=spec, headers=headers)
+        assert response.status_code == 200, response.data
+        seen.extend(item['id'] for item in response.json['items'])
+        if not response.json['next_cursor']:
+            break
+        spec['cursor'] = response.json['next_cursor']
+
+    # ascending by the smallest year, descending by the largest, no year last
+    with_year = item_ids[:-1] if direction == 'asc' else item_ids[:-1][::-1]
+    assert seen == with_year + item_ids[-1:]
@@ -0,0 +1,38 @@
+import pytest
+from app import create_app, db
+
+# the per-address login limit counts each client behind a trusted proxy on
+# its own instead of every client under the proxy's address
+
+
+def make_app(trusted_proxies):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'PASSWORD_HASH_WORKERS': 0,
+        'LOGIN_MAX_FAILURES': 100,
+        'LOGIN_MAX_FAILURES_PER_ADDRESS': 3,
+        'TRUSTED_PROXIES': trusted_proxies,
+    })
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def login(client, email, forwarded_for):
+    return client.post(
+        '/auth/login',
+        json={'email': email, 'password': 'wrong'},
+        headers={'X-Forwarded-For': forwarded_for},
+        environ_base={'REMOTE_ADDR': '10.0.0.1'},
+    )
+
+
+@pytest.mark.parametrize('trusted_proxies, other_client_status', [(1, 401), (0, 429)])
+def test_address_limit_behind_proxy(trusted_proxies, other_client_status):
+    client = make_app(trusted_proxies).test_client()
+    for n in range(3):
+        assert login(client, f'user{n}@example.com', '203.0.113.1').status_code == 401
+    assert login(client, 'user@example.com', '203.0.113.1').status_code == 429
+    # another client behind the same proxy
+    assert login(client, 'user@example.com', '203.0.113.2').status_code == other_client_status